@@ -5,39 +5,201 @@
 # - PTPTN and EMGS Bank Letter hidden from user side only
 # - Admin joins all_counters room and receives live updates
 # - Uses SECRET_KEY and PORT from environment (Render-ready)
-# - DING sound plays on display (and user ticket) with static fallback
+# - DING sound plays on display (and user ticket), served locally with the Socket.IO client
 # - User must enter First + Last name before seeing services
-# - Names saved in names.txt (no duplicates, case-insensitive)
+# - Page CSS/JS served from static/ under content-hashed names, cached immutably
+# - Names saved in names.txt (no duplicates, case-insensitive; indexed in memory)
 # - Admin can clear names with a button
 # - "Medical Insurance" label changed to "Medical Insurance Inquiry" on user side
 # - COUNTER PAGE: shows Next in Line (first waiting ticket) live
+# - Queue state is journaled to PROXIMA_DATA_DIR and restored on restart
+# - Ticket numbers are reserved in blocks and never reissued after a crash;
+#   TICKET_NUMBER_RESET=daily starts them over every day
+# - Readers get immutable state versions (published_state), never the live queue
+# - Several workers/hosts can share one office with PROXIMA_STATE_BACKEND=sqlite
+#   plus SOCKETIO_MESSAGE_QUEUE (sqlite:///path or redis://...)
+# - SOCKETIO_TRANSPORTS=websocket skips the long-polling phase of each connection
+# - Prometheus metrics at /metrics (set METRICS_TOKEN to require a bearer token)
+# - Ticket pages show their place in line and an ETA, pushed live; the ETA
+#   comes from rolling service times (SERVICE_TIME_* settings)
 # --------------------------
 
 import os
+import io
+import sys
+import csv
+import json
+import time
+import gzip
+import heapq
+import bisect
+import hashlib
+import atexit
+import sqlite3
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask, request, redirect, render_template_string, url_for, session, make_response, jsonify
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
+
+from collections import deque, namedtuple
+from functools import partial
+from itertools import chain, islice
+from json.encoder import encode_basestring_ascii as json_string
+from flask import Flask, request, redirect, render_template, url_for, session, make_response, jsonify
 from flask_socketio import SocketIO, emit, join_room
+import socketio as socketio_lib
 import uuid
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get("SECRET_KEY", "secret!")
-socketio = SocketIO(app, async_mode='eventlet')
+
+# Transports in the order clients try them: "polling,websocket" (default:
+# long-poll first, then upgrade), "websocket,polling" (websocket first,
+# polling only if the browser has no WebSocket) or "websocket" (no polling).
+SOCKETIO_TRANSPORTS = [t.strip() for t in os.environ.get("SOCKETIO_TRANSPORTS", "polling,websocket").split(",") if t.strip()]
+SOCKETIO_PING_INTERVAL = int(os.environ.get("SOCKETIO_PING_INTERVAL", "25"))
+SOCKETIO_PING_TIMEOUT = int(os.environ.get("SOCKETIO_PING_TIMEOUT", "20"))
+# payloads smaller than this (bytes) are sent uncompressed over polling
+SOCKETIO_COMPRESSION_THRESHOLD = int(os.environ.get("SOCKETIO_COMPRESSION_THRESHOLD", "1024"))
+
+# initialised with the app (and any message queue) under STATE BACKENDS
+socketio = SocketIO(async_mode='eventlet',
+                    transports=SOCKETIO_TRANSPORTS,
+                    ping_interval=SOCKETIO_PING_INTERVAL,
+                    ping_timeout=SOCKETIO_PING_TIMEOUT,
+                    compression_threshold=SOCKETIO_COMPRESSION_THRESHOLD)
+# handed to io() on every page
+app.jinja_env.globals["socketio_client_options"] = {"transports": SOCKETIO_TRANSPORTS}
 
 # ------------------ DATA ------------------
+
+# Tickets per chunk of a TicketLine
+TICKET_CHUNK = 64
+
+class TicketLine:
+    """An immutable sequence of tickets in arrival order, stored as small chunks.
+
+    append() and remove() return a new line that shares every chunk they do
+    not touch with the old one, so a change copies one chunk and the chunk
+    index (O(n / TICKET_CHUNK + TICKET_CHUNK)) and old lines stay valid.
+    """
+
+    __slots__ = ("_chunks", "_firsts", "_size")
+
+    def __init__(self, chunks=(), firsts=(), size=0):
+        self._chunks = chunks  # tuple of tuples of tickets
+        self._firsts = firsts  # arrival_order of the first ticket in each chunk
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks)
+
+    def head(self):
+        return self._chunks[0][0] if self._chunks else None
+
+    def rank(self, arrival_order):
+        """How many tickets in the line arrived before arrival_order (the chunk index is the rank index)."""
+        i = bisect.bisect_left(self._firsts, arrival_order)
+        if i == 0:
+            return 0
+        return (sum(map(len, self._chunks[:i - 1]))
+                + sum(1 for t in self._chunks[i - 1] if t.arrival_order < arrival_order))
+
+    def tail(self, count):
+        """The last `count` tickets, in order, without walking the rest of the line."""
+        tickets = []
+        for chunk in reversed(self._chunks):
+            if len(tickets) >= count:
+                break
+            tickets[:0] = chunk
+        return tickets[max(len(tickets) - count, 0):] if count > 0 else []
+
+    def append(self, ticket):
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) < TICKET_CHUNK:
+            return TicketLine(chunks[:-1] + (chunks[-1] + (ticket,),), self._firsts, self._size + 1)
+        return TicketLine(chunks + ((ticket,),), self._firsts + (ticket.arrival_order,), self._size + 1)
+
+    def remove(self, ticket):
+        """Return the line without this ticket, which must be in it."""
+        chunks, firsts = self._chunks, self._firsts
+        i = bisect.bisect_right(firsts, ticket.arrival_order) - 1
+        chunk = chunks[i]
+        j = chunk.index(ticket)
+        rest = chunk[:j] + chunk[j + 1:]
+        if not rest:
+            return TicketLine(chunks[:i] + chunks[i + 1:], firsts[:i] + firsts[i + 1:], self._size - 1)
+        if j == 0:
+            firsts = firsts[:i] + (rest[0].arrival_order,) + firsts[i + 1:]
+        return TicketLine(chunks[:i] + (rest,) + chunks[i + 1:], firsts, self._size - 1)
+
+class CategoryQueue:
+    """Waiting tickets of one category, in arrival order.
+
+    Tickets are only ever appended with an increasing arrival_order, so the
+    head is always the earliest arrival and no re-sorting is needed. `line`
+    is the current TicketLine: every change replaces it, which lets
+    publish_state share it as is. Tickets are also keyed by id for lookups.
+    """
+
+    __slots__ = ("_tickets", "line")
+
+    def __init__(self):
+        self._tickets = {}  # ticket id -> ticket
+        self.line = TicketLine()
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __iter__(self):
+        return iter(self.line)
+
+    def __contains__(self, ticket_id):
+        return ticket_id in self._tickets
+
+    def append(self, ticket):
+        self._tickets[ticket.id] = ticket
+        self.line = self.line.append(ticket)
+
+    def peek(self):
+        """Return the earliest waiting ticket, or None if the line is empty."""
+        return self.line.head()
+
+    def get(self, ticket_id):
+        return self._tickets.get(ticket_id)
+
+    def remove(self, ticket_id):
+        """Remove a ticket by id and return it (None if it is not waiting)."""
+        ticket = self._tickets.pop(ticket_id, None)
+        if ticket is not None:
+            self.line = self.line.remove(ticket)
+        return ticket
+
+    def clear(self):
+        self._tickets.clear()
+        self.line = TicketLine()
+
 # Main category queues
 queue = {
-    "Passport Submission": [],
-    "Passport Collection": [],
-    "I-Kad Collection": [],
-    "Medical Insurance Inquiry": [],
-    "EMGS Bank Letter": [],   # admin-only on user side
-    "PTPTN": []               # admin-only on user side
-}
-
-# Counter-specific queues
-counter_queues = {}  # counter_id -> {category -> [tickets]}
+    "Passport Submission": CategoryQueue(),
+    "Passport Collection": CategoryQueue(),
+    "I-Kad Collection": CategoryQueue(),
+    "Medical Insurance Inquiry": CategoryQueue(),
+    "EMGS Bank Letter": CategoryQueue(),   # admin-only on user side
+    "PTPTN": CategoryQueue()               # admin-only on user side
+}
+
+# Counter-specific queues: only the last COUNTER_HISTORY tickets each counter
+# served, whatever their category, are kept (older ones live in the
+# served-ticket archive, see ServedArchive)
+COUNTER_HISTORY = int(os.environ.get("COUNTER_HISTORY", "20"))
+if COUNTER_HISTORY < 1:
+    raise ValueError(f"COUNTER_HISTORY must be at least 1, not {COUNTER_HISTORY}")
+counter_queues = {}  # counter_id -> deque of its last COUNTER_HISTORY tickets, all categories
 
 # Global arrival counter to track order of all tickets
 global_arrival_counter = 0
@@ -51,13 +213,178 @@ ticket_prefixes = {
     "PTPTN": "PT"
 }
 
+# Integer code per category (its position in `queue`); tickets store the code
+CATEGORY_NAMES = tuple(sys.intern(cat) for cat in queue)
+CATEGORY_CODES = {cat: code for code, cat in enumerate(CATEGORY_NAMES)}
+CATEGORY_JSON = tuple(json_string(cat) for cat in CATEGORY_NAMES)
+
+class Ticket(namedtuple("Ticket", ("id", "category_code", "arrival_order",
+                                   "counter_id", "counter_number", "display_id"))):
+    """One issued ticket: an immutable record with no per-instance dict.
+
+    The category is stored as its integer code and the id/counter id strings
+    are interned, so the records of a busy day share their strings. Calling a
+    ticket creates a new record (assign) instead of mutating the waiting one.
+    Deltas, snapshots and the journal carry the dict form (to_wire/from_wire);
+    to_json writes that same form straight to JSON text for state snapshots.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def new(cls, ticket_id, category, arrival_order):
+        return cls(sys.intern(ticket_id), CATEGORY_CODES[category], arrival_order, None, None, None)
+
+    @property
+    def category(self):
+        return CATEGORY_NAMES[self.category_code]
+
+    def assign(self, counter_id, counter_number):
+        """The record of this ticket once called by a counter."""
+        return Ticket(self.id, self.category_code, self.arrival_order,
+                      sys.intern(counter_id), counter_number, self.id)
+
+    def to_wire(self):
+        ticket_id, code, arrival_order, counter_id, counter_number, display_id = self
+        wire = {"id": ticket_id, "category": CATEGORY_NAMES[code], "arrival_order": arrival_order,
+                "counter_id": counter_id, "counter_number": counter_number}
+        if display_id is not None:
+            wire["display_id"] = display_id
+        return wire
+
+    def to_json(self):
+        ticket_id, code, arrival_order, counter_id, counter_number, display_id = self
+        return (f'{{"id":{json_string(ticket_id)},"category":{CATEGORY_JSON[code]},'
+                f'"arrival_order":{arrival_order},'
+                f'"counter_id":{"null" if counter_id is None else json_string(counter_id)},'
+                f'"counter_number":{"null" if counter_number is None else counter_number}'
+                + ("}" if display_id is None else f',"display_id":{json_string(display_id)}}}'))
+
+    @classmethod
+    def from_wire(cls, wire):
+        ticket_id = sys.intern(wire["id"])
+        counter_id = wire.get("counter_id")
+        return cls(ticket_id, CATEGORY_CODES[wire["category"]], wire["arrival_order"],
+                   counter_id and sys.intern(counter_id), wire.get("counter_number"),
+                   ticket_id if wire.get("display_id") == ticket_id else wire.get("display_id"))
+
 # Counter-specific numbering system
 counter_numbers = {}  # counter_id -> {category -> current_number}
 
+# Rolling service times: weight of the newest call_next interval in the
+# averages, the pace (seconds per ticket) assumed for a counter with no
+# figure yet, and the longest interval still counted as service (longer
+# ones are breaks)
+SERVICE_TIME_ALPHA = float(os.environ.get("SERVICE_TIME_ALPHA", "0.2"))
+SERVICE_TIME_DEFAULT = float(os.environ.get("SERVICE_TIME_DEFAULT", "180"))
+SERVICE_TIME_MAX_GAP = float(os.environ.get("SERVICE_TIME_MAX_GAP", "1800"))
+
+class ServiceTimes:
+    """EWMAs of the intervals between call_next calls, per category and per counter.
+
+    A category's figure is how often its line moves: the interval between two
+    calls of its tickets by any counter, counted only if the second ticket
+    was already waiting at the first call, so empty spells are left out. A
+    counter's figure is its own pace: the interval between two of its calls
+    while it was serving. Both are fed from ticket_assigned deltas, which
+    carry the call time, so replay and every worker agree on them. The dicts
+    are replaced on every change, never mutated, so state versions share them.
+    """
+
+    __slots__ = ("categories", "counters")
+
+    def __init__(self):
+        self.categories = {}  # category -> (average or None, last call time, global_arrival_counter then)
+        self.counters = {}    # counter_id -> (average or None, last call time or None while idle)
+
+    def called(self, ticket, at, arrivals):
+        """Record the call of `ticket` at time `at`, when arrivals tickets had been issued."""
+        last = self.categories.get(ticket.category)
+        average = last[0] if last else None
+        if last and ticket.arrival_order <= last[2]:
+            average = self._average(average, at - last[1])
+        self.categories = {**self.categories, ticket.category: (average, at, arrivals)}
+        last = self.counters.get(ticket.counter_id)
+        average = last[0] if last else None
+        if last and last[1] is not None:
+            average = self._average(average, at - last[1])
+        self.counters = {**self.counters, ticket.counter_id: (average, at)}
+
+    def idle(self, counter_id):
+        """The counter has nobody to serve: its next call starts a new interval."""
+        last = self.counters.get(counter_id)
+        if last and last[1] is not None:
+            self.counters = {**self.counters, counter_id: (last[0], None)}
+
+    def forget(self, counter_id):
+        if counter_id in self.counters:
+            self.counters = {cid: last for cid, last in self.counters.items() if cid != counter_id}
+
+    @staticmethod
+    def _average(average, interval):
+        if not 0 <= interval <= SERVICE_TIME_MAX_GAP:
+            return average
+        return interval if average is None else average + SERVICE_TIME_ALPHA * (interval - average)
+
+    def to_wire(self):
+        return {"categories": self.categories, "counters": self.counters}
+
+    def load(self, wire):
+        self.categories = {cat: tuple(entry) for cat, entry in wire['categories'].items()}
+        self.counters = {cid: tuple(entry) for cid, entry in wire['counters'].items()}
+
+    def clear(self):
+        self.categories = {}
+        self.counters = {}
+
+service_times = ServiceTimes()
+
 # Category counters for initial ticket generation
 category_counters = {k: 0 for k in queue.keys()}
+# Day the numbers in category_counters belong to (None unless they reset daily)
+numbering_day = None
 counters = {}  # counter_id -> dict: name, categories, current_ticket
 
+# Ticket registry: every waiting ticket, plus the called ones still in a
+# counter's recent-served history; tickets leave it when they leave both
+TICKET_WAITING = "waiting"
+TICKET_CALLED = "called"
+ticket_registry = {}  # ticket_id -> {"ticket": ticket, "state": TICKET_*}
+
+# Sequence number of the last queue_delta broadcast to counters/admin
+state_seq = 0
+
+# get_full_state() encoded as UTF-8 JSON, rebuilt only when state_seq moves on
+_encoded_state = {"seq": None, "data": None}
+
+# How many waiting tickets a counter page lists (it also gets the total)
+COUNTER_VIEW_HEAD = int(os.environ.get("COUNTER_VIEW_HEAD", "50"))
+
+# Head of the merged waiting line, as JSON, shared by counters serving the same set of categories
+_waiting_views = {}  # tuple(categories) -> '"waiting":[...],"waiting_count":n,"next":...'
+
+# Tickets taken out of each line since its last wait broadcast, and the
+# seconds per place its phones were last told
+_pending_removals = {}  # category -> [[seq, arrival_order], ...]
+_sent_per_place = {}    # category -> seconds per place (or None)
+
+# Read-only copy of the state that readers (joins, broadcasts, the display
+# and admin pages, snapshots on disk) use instead of the live structures
+# above. Every change publishes a new version. Waiting lines are TicketLines
+# and counters the change did not touch are shared with the previous
+# version, so publishing copies only what changed and taking a snapshot is
+# just reading `published_state`. Nothing reachable from a version is ever
+# mutated.
+StateVersion = namedtuple("StateVersion", ("seq", "queue", "counters", "counter_queues",
+                                           "global_arrival_counter", "category_counters",
+                                           "numbering_day", "counter_numbers", "service_times"))
+published_state = StateVersion(0, {cat: waiting.line for cat, waiting in queue.items()}, {}, {}, 0,
+                               dict(category_counters), None, {}, service_times.to_wire())
+
+# What apply_delta changed since the last publish_state()
+_changed_categories = set()
+_changed_counters = set()  # counter ids whose record, numbers or history changed
+
 # Categories shown to users (Special Pass removed; EMGS & PTPTN hidden)
 user_categories = [
     "Passport Submission",
@@ -66,39 +393,250 @@ user_categories = [
     "Medical Insurance Inquiry"
 ]
 
+# ------------------ HELPERS: ticket registry ------------------
+
+def get_waiting_ticket(ticket_id, category=None, arrival_order=None):
+    """Return the ticket if it is still waiting (optionally in the given category, and the very
+    ticket issued at arrival_order rather than a later one with the same id), else None."""
+    record = ticket_registry.get(ticket_id)
+    if not record or record['state'] != TICKET_WAITING:
+        return None
+    if category is not None and record['ticket'].category != category:
+        return None
+    if arrival_order is not None and record['ticket'].arrival_order != arrival_order:
+        return None
+    return record['ticket']
+
+def forget_ticket(ticket):
+    """Drop a ticket from the registry, unless its id was reissued to a newer ticket since."""
+    record = ticket_registry.get(ticket.id)
+    if record is not None and record['ticket'].arrival_order == ticket.arrival_order:
+        del ticket_registry[ticket.id]
+
+def hold_ticket(user_session, ticket):
+    # with the arrival order: after a daily reset the id may be reissued to someone else
+    user_session[f"ticket_{ticket.category}"] = [ticket.id, ticket.arrival_order]
+
+def held_ticket(user_session, category):
+    """The ticket this session was issued in the category if it is still waiting, else None."""
+    held = user_session.get(f"ticket_{category}")
+    if not isinstance(held, list):
+        return None  # nothing, or a bare id from before arrival orders were kept
+    ticket_id, arrival_order = held
+    return get_waiting_ticket(ticket_id, category, arrival_order)
+
+def find_active_ticket(user_session):
+    """Return (category, ticket_id) of the first waiting ticket held in this session, or (None, None)."""
+    for cat in queue:
+        ticket = held_ticket(user_session, cat)
+        if ticket is not None:
+            return cat, ticket.id
+    return None, None
+
 # ------------------ HELPERS: save/load/clear names ------------------
 
 NAMES_FILE = "names.txt"
+NAMES_PAGE_SIZE = 100
+NAMES_PAGE_MAX = 500
+
+class NameStore:
+    """Registered names in names.txt with an in-memory case-insensitive index.
+
+    The file is read once when the store is created; after that checking a
+    name is a set lookup and saving a new one appends a single line. A sorted
+    list of the lowercased names backs paging and prefix search; names added
+    since the last page are merged into it when the next page is asked for,
+    so a sign-in never pays for keeping it sorted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._names = []   # original capitalization, in registration order
+        self._keys = {}    # lowercased name -> original
+        self._sorted = []  # lowercased names, sorted
+        self._unsorted = []  # lowercased names added since, not merged in yet
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._index(line.strip())
+        except FileNotFoundError:
+            pass
+
+    def _index(self, name):
+        key = name.lower()
+        if name and key not in self._keys:
+            self._keys[key] = name
+            self._names.append(name)
+            self._unsorted.append(key)
+            return True
+        return False
+
+    def add(self, name):
+        if self._index(name):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(name + "\n")
+
+    def all(self):
+        return list(self._names)
+
+    def page(self, prefix="", cursor="", limit=NAMES_PAGE_SIZE):
+        """Names in alphabetical order starting with prefix, after cursor.
+
+        Returns (names, next_cursor); next_cursor is None on the last page.
+        """
+        if self._unsorted:
+            self._unsorted.sort()
+            self._sorted = list(heapq.merge(self._sorted, self._unsorted))
+            self._unsorted = []
+        keys = self._sorted
+        if cursor:
+            i = bisect.bisect_right(keys, cursor)
+        else:
+            i = bisect.bisect_left(keys, prefix)
+        found = []
+        while i < len(keys) and len(found) <= limit and keys[i].startswith(prefix):
+            found.append(keys[i])
+            i += 1
+        next_cursor = found[limit - 1] if len(found) > limit else None
+        return [self._keys[k] for k in found[:limit]], next_cursor
+
+    def count(self):
+        return len(self._names)
+
+    def clear(self):
+        open(self.path, "w", encoding="utf-8").close()
+        self._names = []
+        self._keys = {}
+        self._sorted = []
+        self._unsorted = []
+
+class SQLiteNameStore:
+    """Registered names in SQLite with a unique case-insensitive index (shared by all workers)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute("CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS names_lower ON names (lower(name))")
+            self._conn = conn
+        return self._conn
+
+    def add(self, name):
+        if name:
+            self._connect().execute("INSERT OR IGNORE INTO names (name) VALUES (?)", (name,))
+
+    def all(self):
+        return [name for (name,) in self._connect().execute("SELECT name FROM names ORDER BY id")]
+
+    def page(self, prefix="", cursor="", limit=NAMES_PAGE_SIZE):
+        # range scans on the lower(name) index, same contract as NameStore.page
+        rows = self._connect().execute(
+            "SELECT name, lower(name) FROM names WHERE lower(name) > ? AND lower(name) >= ? "
+            "AND lower(name) < ? ORDER BY lower(name) LIMIT ?",
+            (cursor, prefix, prefix + "\uffff", limit + 1)).fetchall()
+        next_cursor = rows[limit - 1][1] if len(rows) > limit else None
+        return [name for name, _ in rows[:limit]], next_cursor
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+    def clear(self):
+        self._connect().execute("DELETE FROM names")
 
 def save_user_name(first, last):
-    """Save full name into names.txt (one per line). Prevent duplicates (case-insensitive)."""
+    """Save full name (no duplicates, case-insensitive)."""
     full = f"{first.strip()} {last.strip()}".strip()
     if not full:
         return
-    # Ensure file exists
-    if not os.path.exists(NAMES_FILE):
-        open(NAMES_FILE, "a", encoding="utf-8").close()
-    # Read existing names (case-insensitive set)
-    try:
-        with open(NAMES_FILE, "r", encoding="utf-8") as f:
-            existing = {line.strip().lower() for line in f if line.strip()}
-    except FileNotFoundError:
-        existing = set()
-    if full.lower() not in existing:
-        with open(NAMES_FILE, "a", encoding="utf-8") as f:
-            f.write(full + "\n")
+    name_store.add(full)
 
 def load_user_names():
     """Return list of stored full names (preserve original capitalization)."""
-    try:
-        with open(NAMES_FILE, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f if line.strip()]
-    except FileNotFoundError:
-        return []
+    return name_store.all()
+
+def search_user_names(prefix="", cursor="", limit=NAMES_PAGE_SIZE):
+    """One page of stored names (case-insensitive prefix match), see NameStore.page."""
+    return name_store.page(prefix.strip().lower(), cursor, max(1, min(limit, NAMES_PAGE_MAX)))
 
 def clear_user_names():
-    """Clear the names file."""
-    open(NAMES_FILE, "w", encoding="utf-8").close()
+    """Clear the stored names."""
+    name_store.clear()
+
+# ------------------ STATIC ASSETS ------------------
+
+# CSS/JS under static/css and static/js (plus the Socket.IO client and the
+# ding in static/) are linked by content-hashed names (css/ticket.1a2b3c4d5e.css)
+# and cached by browsers for a year, so pages work with no outside internet.
+# gzip (and brotli, when the module is installed) copies of the text assets
+# are compressed once at startup.
+ASSET_DIRS = ("", "css", "js")
+ASSET_TYPES = {".css": "text/css", ".js": "application/javascript", ".mp3": "audio/mpeg"}
+ASSET_COMPRESSED = (".css", ".js")
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def build_assets(static_dir):
+    """Fingerprint and precompress the assets. Returns (urls, files)."""
+    urls = {}   # "css/ticket.css" -> "css/ticket.<hash>.css", "ding.mp3" -> "ding.<hash>.mp3"
+    files = {}  # "css/ticket.<hash>.css" -> {"etag", "mimetype", "identity", "gzip", "br"}
+    for folder in ASSET_DIRS:
+        path = os.path.join(static_dir, folder)
+        if not os.path.isdir(path):
+            continue
+        for filename in sorted(os.listdir(path)):
+            base, ext = os.path.splitext(filename)
+            if ext not in ASSET_TYPES or not os.path.isfile(os.path.join(path, filename)):
+                continue
+            with open(os.path.join(path, filename), "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            prefix = f"{folder}/" if folder else ""
+            hashed = f"{prefix}{base}.{digest}{ext}"
+            urls[prefix + filename] = hashed
+            variants = {"identity": data}
+            if ext in ASSET_COMPRESSED:
+                variants["gzip"] = gzip.compress(data, 9, mtime=0)
+                if brotli is not None:
+                    variants["br"] = brotli.compress(data, quality=11)
+            files[hashed] = {"etag": digest, "mimetype": ASSET_TYPES[ext], **variants}
+    return urls, files
+
+asset_urls, asset_files = build_assets(app.static_folder)
+
+@app.template_global()
+def asset_url(name):
+    """URL of a static asset under its content-hashed name."""
+    return url_for("static", filename=asset_urls.get(name, name))
+
+def send_static(filename):
+    asset = asset_files.get(filename)
+    if asset is None:
+        return app.send_static_file(filename)
+    body, encoding = asset["identity"], None
+    for name in ("br", "gzip"):
+        if name in asset and request.accept_encodings[name] and len(asset[name]) < len(body):
+            body, encoding = asset[name], name
+            break
+    response = make_response(body)
+    response.mimetype = asset["mimetype"]
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    response.set_etag(f"{asset['etag']}-{encoding or 'identity'}")
+    # byte ranges only on the uncompressed body (Safari fetches audio in ranges)
+    return response.make_conditional(request, accept_ranges=encoding is None, complete_length=len(body))
+
+# replaces Flask's default /static view (unhashed names fall through to it)
+app.view_functions["static"] = send_static
 
 # ------------------ TEMPLATES ------------------
 
@@ -108,108 +646,7 @@ username_template = """
 <head>
 <title>Enter Your Name | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  display: flex;
-  align-items: center;
-  justify-content: center;
-  min-height: 100vh;
-  color: var(--text);
-}
-.container {
-  background: var(--card-bg);
-  padding: 2.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  text-align: center;
-  width: 100%;
-  max-width: 400px;
-  margin: 1rem;
-}
-.logo {
-  font-size: 1.5rem;
-  font-weight: 700;
-  color: var(--primary);
-  margin-bottom: 1.5rem;
-  letter-spacing: -0.5px;
-  display: inline-flex;
-  align-items: center;
-  background: linear-gradient(135deg, var(--primary), #4f46e5);
-  -webkit-background-clip: text;
-  background-clip: text;
-  -webkit-text-fill-color: transparent;
-  position: relative;
-}
-
-.logo span.highlight {
-  color: var(--accent);
-  -webkit-text-fill-color: var(--accent);
-  font-weight: 800;
-  margin: 0 0.15rem;
-}
-h1 {
-  color: var(--text);
-  margin-bottom: 1.5rem;
-  font-size: 1.5rem;
-  font-weight: 600;
-}
-input {
-  display: block;
-  width: 100%;
-  padding: 0.875rem 1rem;
-  margin: 0.75rem 0;
-  border-radius: 0.5rem;
-  border: 1px solid #e2e8f0;
-  font-size: 1rem;
-  transition: var(--transition);
-  box-sizing: border-box;
-}
-input:focus {
-  outline: none;
-  border-color: var(--primary);
-  box-shadow: 0 0 0 3px var(--primary-light);
-}
-button {
-  width: 100%;
-  padding: 0.875rem 1rem;
-  border: none;
-  border-radius: 0.5rem;
-  background: var(--primary);
-  color: white;
-  font-size: 1rem;
-  font-weight: 500;
-  cursor: pointer;
-  transition: var(--transition);
-  margin-top: 0.5rem;
-}
-button:hover {
-  background: var(--primary-dark);
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(37, 99, 235, 0.2);
-}
-.note {
-  font-size: 0.875rem;
-  color: var(--text-light);
-  margin-top: 1rem;
-  line-height: 1.5;
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/username.css') }}">
 </head>
 <body>
 <div class="container">
@@ -232,92 +669,7 @@ user_template = """
 <head>
 <title>Service Selection | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  display: flex;
-  align-items: center;
-  justify-content: center;
-  min-height: 100vh;
-  color: var(--text);
-}
-.container {
-  width: 100%;
-  max-width: 400px;
-  background: var(--card-bg);
-  padding: 2.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  text-align: center;
-  margin: 1rem;
-}
-.logo {
-  font-size: 1.5rem;
-  font-weight: 700;
-  color: var(--primary);
-  margin-bottom: 1.5rem;
-  letter-spacing: -0.5px;
-}
-h1 {
-  color: var(--text);
-  margin: 0 0 1.5rem;
-  font-size: 1.5rem;
-  font-weight: 600;
-}
-.service-btn {
-  display: block;
-  width: 100%;
-  padding: 1rem 1.25rem;
-  margin: 0.75rem 0;
-  border-radius: 0.5rem;
-  border: none;
-  background: var(--primary);
-  color: #fff;
-  font-size: 1rem;
-  font-weight: 500;
-  cursor: pointer;
-  transition: var(--transition);
-  text-align: left;
-  position: relative;
-}
-.service-btn:after {
-  content: '→';
-  position: absolute;
-  right: 1.25rem;
-  top: 50%;
-  transform: translateY(-50%);
-  transition: var(--transition);
-}
-.service-btn:hover {
-  background: var(--primary-dark);
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(37, 99, 235, 0.2);
-}
-.service-btn:hover:after {
-  right: 1rem;
-}
-.small {
-  font-size: 0.875rem;
-  color: var(--text-light);
-  margin-top: 1.5rem;
-  line-height: 1.5;
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/services.css') }}">
 </head>
 <body>
 <div class="container">
@@ -329,11 +681,7 @@ h1 {
   <div class="small">After selecting, you'll get a ticket number.</div>
 </div>
 
-<script>
-function selectService(category){
-    location.href = "/ticket_page/" + encodeURIComponent(category);
-}
-</script>
+<script src="{{ asset_url('js/services.js') }}"></script>
 </body>
 </html>
 """
@@ -344,289 +692,11 @@ ticket_page_template = """
 <head>
 <title>Your Ticket | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --danger: #ef4444;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  display: flex;
-  align-items: center;
-  justify-content: center;
-  min-height: 100vh;
-  color: var(--text);
-}
-.card {
-  background: var(--card-bg);
-  padding: 2.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  text-align: center;
-  width: 100%;
-  max-width: 420px;
-  margin: 1rem;
-  position: relative;
-  overflow: hidden;
-}
-.card:before {
-  content: '';
-  position: absolute;
-  top: 0;
-  left: 0;
-  right: 0;
-  height: 0.25rem;
-  background: var(--primary);
-}
-.logo {
-  font-size: 1.5rem;
-  font-weight: 700;
-  color: var(--primary);
-  margin-bottom: 1.5rem;
-  letter-spacing: -0.5px;
-}
-h1 {
-  color: var(--text);
-  margin: 0 0 1rem;
-  font-size: 1.5rem;
-  font-weight: 600;
-}
-#ticket_number {
-  font-size: 3rem;
-  color: var(--primary);
-  margin: 1.5rem 0;
-  font-weight: 700;
-  letter-spacing: -0.5px;
-  position: relative;
-  display: inline-block;
-  padding: 0.5rem 2rem;
-}
-#ticket_number:before {
-  content: '';
-  position: absolute;
-  top: 0;
-  left: 0;
-  right: 0;
-  bottom: 0;
-  background: var(--primary-light);
-  border-radius: 0.5rem;
-  z-index: -1;
-}
-.info {
-  color: var(--text);
-  margin: 1rem 0;
-  font-size: 1rem;
-  display: flex;
-  align-items: center;
-  justify-content: center;
-  gap: 0.5rem;
-}
-.info strong {
-  color: var(--primary-dark);
-}
-.status-container {
-  margin: 1.5rem 0;
-  padding: 1rem;
-  background: #f1f5f9;
-  border-radius: 0.5rem;
-}
-#waiting, #counter_info {
-  margin: 0.5rem 0;
-}
-.small {
-  color: var(--text-light);
-  margin-top: 1.5rem;
-  font-size: 0.875rem;
-  line-height: 1.5;
-}
-.pulse {
-  animation: pulse 2s infinite;
-}
-@keyframes pulse {
-  0% {
-    box-shadow: 0 0 0 0 rgba(37, 99, 235, 0.4);
-  }
-  70% {
-    box-shadow: 0 0 0 10px rgba(37, 99, 235, 0);
-  }
-  100% {
-    box-shadow: 0 0 0 0 rgba(37, 99, 235, 0);
-  }
-}
-.called {
-  color: var(--success) !important;
-  animation: scale 0.5s ease;
-}
-@keyframes scale {
-  0% { transform: scale(1); }
-  50% { transform: scale(1.2); }
-  100% { transform: scale(1); }
-}
-#notification {
-  position: fixed;
-  top: 20px;
-  right: 20px;
-  background: var(--success);
-  color: white;
-  padding: 1rem;
-  border-radius: 0.5rem;
-  box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-  display: none;
-  z-index: 100;
-  animation: slideIn 0.3s ease;
-}
-@keyframes slideIn {
-  from { transform: translateX(100%); opacity: 0; }
-  to { transform: translateX(0); opacity: 1; }
-}
-
-.delete-btn {
-  background-color: var(--danger);
-  color: white;
-  border: none;
-  padding: 0.75rem 1.5rem;
-  border-radius: 0.5rem;
-  font-weight: 600;
-  cursor: pointer;
-  margin-top: 1.5rem;
-  transition: var(--transition);
-}
-
-.primary-btn {
-  background-color: var(--primary);
-  color: white;
-  border: none;
-  padding: 0.75rem 1.5rem;
-  border-radius: 0.5rem;
-  font-weight: 600;
-  cursor: pointer;
-  margin-top: 1.5rem;
-  transition: var(--transition);
-  display: inline-block;
-  text-decoration: none;
-}
-.primary-btn:hover {
-  background-color: var(--primary-dark);
-  transform: translateY(-2px);
-}
-
-.delete-btn:hover {
-  background-color: #dc2626;
-  transform: translateY(-2px);
-}
-
-.delete-btn:active {
-  transform: translateY(0);
-}
-
-.modal {
-  display: none;
-  position: fixed;
-  top: 0;
-  left: 0;
-  width: 100%;
-  height: 100%;
-  background-color: rgba(0, 0, 0, 0.5);
-  z-index: 1000;
-  align-items: center;
-  justify-content: center;
-}
-
-.modal-content {
-  background-color: var(--card-bg);
-  padding: 2rem;
-  border-radius: 1rem;
-  max-width: 400px;
-  width: 90%;
-  text-align: center;
-  box-shadow: var(--card-shadow);
-}
-
-.modal-buttons {
-  display: flex;
-  justify-content: center;
-  gap: 1rem;
-  margin-top: 1.5rem;
-}
-
-.modal-btn {
-  padding: 0.75rem 1.5rem;
-  border-radius: 0.5rem;
-  font-weight: 600;
-  cursor: pointer;
-  border: none;
-  transition: var(--transition);
-}
-
-.confirm-btn {
-  background-color: var(--danger);
-  color: white;
-}
-
-.cancel-btn {
-  background-color: var(--text-light);
-  color: white;
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/ticket.css') }}">
 </head>
-<body>
+<body data-ticket-id="{{ ticket.id }}" data-arrival-order="{{ ticket.arrival_order }}">
   <!-- Prevent back button with warning -->
-  <script>
-    var ticketServed = false;
-
-    // If a previous ticket session was terminated, redirect to home
-    try {
-      if (localStorage.getItem("ticket_terminated") === "1") {
-        localStorage.removeItem("ticket_terminated");
-        location.replace("/");
-      }
-    } catch(e) {}
-  
-    // Prevent back button navigation
-    history.pushState(null, null, document.URL);
-    window.addEventListener('popstate', function (event) {
-      if (!ticketServed) {
-        // Show warning and prevent navigation
-        alert("Your ticket has not been served yet. Please wait for your ticket to be called or delete it if you want to leave.");
-        history.pushState(null, null, document.URL);
-      }
-    });
-  
-    // Prevent page refresh with warning
-    window.addEventListener('beforeunload', function (event) {
-      if (!ticketServed) {
-        event.preventDefault();
-        event.returnValue = 'Your ticket has not been served yet. Are you sure you want to leave?';
-        return 'Your ticket has not been served yet. Are you sure you want to leave?';
-      }
-    });
-
-    // Safari/iOS: BFCache handling — reload on back/forward to re-run server checks
-    window.addEventListener('pageshow', function (event) {
-      var navEntries = (performance && performance.getEntriesByType) ? performance.getEntriesByType('navigation') : null;
-      var isBackForward = navEntries && navEntries[0] && navEntries[0].type === 'back_forward';
-      if ((event.persisted || isBackForward) && !ticketServed) {
-        // Force a full reload so server-side session checks/redirects apply
-        window.location.reload();
-      }
-    });
-
-    // Register an unload handler to discourage Safari from putting this page in BFCache
-    // (empty handler is enough to disqualify some versions of Safari)
-    window.addEventListener('unload', function(){});
-  </script>
+  <script src="{{ asset_url('js/ticket_guard.js') }}"></script>
 <div class="card">
   <div class="logo">Proxima <span class="highlight">X</span> APU</div>
   <h1>Your Ticket</h1>
@@ -638,6 +708,7 @@ h1 {
   <div id="ticket_number" class="pulse">{{ ticket.id }}</div>
   <div class="info">Service: <strong>{{ ticket.category }}</strong></div>
   <div class="status-container">
+    <div id="waiting" class="info"{% if wait %} data-position="{{ wait.position }}" data-eta="{{ wait.eta if wait.eta is not none }}" data-seq="{{ wait.seq }}"{% endif %}></div>
     <div id="counter_info" class="info">Assigned Counter: Not yet</div>
   </div>
   <div class="small">Please wait — you will be notified when your ticket is called.</div>
@@ -667,119 +738,12 @@ h1 {
   </div>
 </div>
 
-<!-- ticket ding audio element (uses static/ding.mp3 if present; fallback handled in JS) -->
-<audio id="ticket-ding" src="{{ ding_url }}"></audio>
-
-<script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
-<script>
-var socket = io();
-var ticketId = "{{ ticket.id }}";
-socket.emit("join_ticket_room", {ticket_id: ticketId});
-
-// ticket ding element & fallback
-var ticketDing = document.getElementById('ticket-ding');
-ticketDing.preload = "auto";
-ticketDing.addEventListener('error', function(){
-    ticketDing.src = "https://www.soundjay.com/buttons/sounds/button-16.mp3";
-    ticketDing.load();
-});
-
-// Request notification permission
-if ("Notification" in window) {
-    Notification.requestPermission();
-}
+<!-- ticket ding audio element (static/ding.mp3) -->
+<audio id="ticket-ding" src="{{ asset_url('ding.mp3') }}"></audio>
 
-function showNotification(title, message) {
-    // Browser notification
-    if ("Notification" in window && Notification.permission === "granted") {
-        new Notification(title, { body: message });
-    }
-    
-    // In-page notification
-    var notificationEl = document.getElementById('notification');
-    notificationEl.textContent = message;
-    notificationEl.style.display = 'block';
-    
-    setTimeout(function() {
-        notificationEl.style.display = 'none';
-    }, 10000);
-}
-
-
-
-socket.on("ticket_called", function(data){
-    if(data.id === ticketId){
-        try { 
-            ticketDing.currentTime = 0; 
-            ticketDing.play().catch(function(e) {
-                console.log("Audio play error:", e);
-            }); 
-        } catch(e){}
-        
-        // Update UI
-        document.getElementById('counter_info').innerHTML = "Assigned Counter: <strong>" + data.counter_name + "</strong>";
-        var ticketNumber = document.getElementById('ticket_number');
-        ticketNumber.classList.remove('pulse');
-        ticketNumber.classList.add('called');
-        
-        // Show notification
-        showNotification(
-            "Your ticket is ready!", 
-            "Ticket " + ticketId + " is now being served at " + data.counter_name
-        );
-        
-        // Mark ticket as served - allow navigation
-        ticketServed = true;
-
-        // Terminate session and force restart flow (cross-browser safe)
-        try { localStorage.setItem('ticket_terminated', '1'); } catch(e) {}
-        fetch('/end_ticket_session', { method: 'POST' })
-            .then(function(){ location.replace('/'); })
-            .catch(function(){ location.replace('/'); });
-        
-        // Vibrate if supported
-        if ("vibrate" in navigator) {
-            navigator.vibrate([200, 100, 200]);
-        }
-    }
-});
-
-// Delete ticket functionality
-document.getElementById('delete-ticket').addEventListener('click', function() {
-    var modal = document.getElementById('delete-modal');
-    modal.style.display = 'flex';
-});
-
-document.getElementById('cancel-delete').addEventListener('click', function() {
-    var modal = document.getElementById('delete-modal');
-    modal.style.display = 'none';
-});
-
-document.getElementById('confirm-delete').addEventListener('click', function() {
-    // Send delete request to server
-    fetch('/delete_ticket/' + ticketId, {
-        method: 'POST'
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            showNotification("Ticket Deleted", "Your ticket has been successfully deleted");
-            // Mark ticket as deleted - allow navigation
-            ticketServed = true;
-            // Redirect to home page after a short delay
-            setTimeout(function() {
-                window.location.href = '/';
-            }, 2000);
-        } else {
-            showNotification("Error", data.message || "Failed to delete ticket");
-        }
-    })
-    .catch(error => {
-        showNotification("Error", "An error occurred while deleting the ticket");
-        console.error('Error:', error);
-    });
-});
-</script>
+<script>var socketOptions = {{ socketio_client_options|tojson }};</script>
+<script src="{{ asset_url('js/socket.io.min.js') }}"></script>
+<script src="{{ asset_url('js/ticket.js') }}"></script>
 </body>
 </html>
 """
@@ -790,188 +754,9 @@ counter_template = """
 <head>
 <title>Counter - {{ counter.name }} | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  padding: 2rem 1.5rem;
-  color: var(--text);
-}
-.header {
-  display: flex;
-  align-items: center;
-  justify-content: space-between;
-  margin-bottom: 1.5rem;
-  flex-wrap: wrap;
-  gap: 1rem;
-}
-.logo {
-  font-size: 1.5rem;
-  font-weight: 700;
-  color: var(--primary);
-  margin-bottom: 1rem;
-  letter-spacing: -0.5px;
-}
-h1 {
-  color: var(--text);
-  margin: 0;
-  font-size: 1.75rem;
-  font-weight: 600;
-}
-.box {
-  background: var(--card-bg);
-  padding: 1.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  margin-top: 1rem;
-}
-
-.top-controls {
-  display: flex;
-  justify-content: flex-start;
-  margin-bottom: 1.5rem;
-  position: sticky;
-  top: 0;
-  z-index: 10;
-}
-
-.call-next-btn {
-  background: var(--primary);
-  color: white;
-  border: none;
-  border-radius: 0.5rem;
-  padding: 0.75rem 1.25rem;
-  font-weight: 500;
-  cursor: pointer;
-  transition: var(--transition);
-}
-
-.call-next-btn:hover {
-  background: var(--primary-dark);
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(37, 99, 235, 0.2);
-}
-
-.call-again-btn {
-  background: var(--accent);
-  color: white;
-  border: none;
-  border-radius: 0.5rem;
-  padding: 0.75rem 1.25rem;
-  font-weight: 500;
-  cursor: pointer;
-  transition: var(--transition);
-  margin-left: 0.75rem;
-}
-
-.call-again-btn:hover:not(:disabled) {
-  background: #e86306;
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(249, 115, 22, 0.2);
-}
-
-.call-again-btn:disabled {
-  background: #cbd5e1;
-  cursor: not-allowed;
-  color: #64748b;
-}
-
-.call-again-btn.active {
-  animation: pulse 1s;
-}
-
-@keyframes pulse {
-  0% { transform: scale(1); }
-  50% { transform: scale(1.05); }
-  100% { transform: scale(1); }
-}
-button {
-  background: var(--primary);
-  color: white;
-  border: none;
-  padding: 0.875rem 1.5rem;
-  border-radius: 0.5rem;
-  cursor: pointer;
-  font-size: 1rem;
-  font-weight: 500;
-  transition: var(--transition);
-}
-button:hover {
-  background: var(--primary-dark);
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(37, 99, 235, 0.2);
-}
-#current_ticket {
-  font-size: 1.5rem;
-  color: var(--primary);
-  margin: 1rem 0;
-  font-weight: 600;
-  padding: 1rem;
-  background: var(--primary-light);
-  border-radius: 0.5rem;
-  text-align: center;
-}
-#next_in_line {
-  font-size: 1.125rem;
-  color: var(--text);
-  margin: 1rem 0;
-  padding: 0.75rem;
-  background: #f1f5f9;
-  border-radius: 0.5rem;
-  text-align: center;
-}
-.services {
-  display: inline-flex;
-  align-items: center;
-  padding: 0.5rem 1rem;
-  background: var(--primary-light);
-  border-radius: 2rem;
-  color: var(--primary);
-  font-weight: 500;
-  font-size: 0.875rem;
-}
-h3 {
-  color: var(--text);
-  margin: 1.5rem 0 1rem;
-  font-size: 1.25rem;
-  font-weight: 600;
-}
-ul {
-  padding-left: 0;
-  list-style: none;
-  margin: 1rem 0 1.5rem;
-}
-li {
-  margin: 0.5rem 0;
-  padding: 0.75rem 1rem;
-  background: #f1f5f9;
-  border-radius: 0.5rem;
-  display: flex;
-  align-items: center;
-}
-li:before {
-  content: '•';
-  color: var(--primary);
-  font-weight: bold;
-  margin-right: 0.5rem;
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/counter.css') }}">
 </head>
-<body>
+<body data-counter-id="{{ counter_id }}">
 <div class="logo">Proxima <span class="highlight">X</span> APU</div>
 <div class="header">
   <h1>Counter: {{ counter.name }}</h1>
@@ -989,82 +774,9 @@ li:before {
   <ul id="queue_list"></ul>
 </div>
 
-<script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
-<script>
-var socket = io();
-var counterId = "{{ counter_id }}";
-socket.emit("join_counter_room", {counter_id: counterId});
-
-// Track the current ticket for Call Again functionality
-var currentTicketId = null;
-
-// update UI when queue_update arrives
-socket.on("queue_update", function(data){
-    var c = data.counters[counterId];
-    if(!c){
-        document.getElementById('current_ticket').innerText = "No ticket being served";
-        document.getElementById('next_in_line').innerText = "Next: None";
-        document.getElementById('queue_list').innerHTML = "";
-        document.getElementById('call-again-btn').disabled = true;
-        currentTicketId = null;
-        return;
-    }
-    
-    // Update current ticket and Call Again button state
-    if (c.current_ticket) {
-        document.getElementById('current_ticket').innerText = "Serving: " + c.current_ticket;
-        currentTicketId = c.current_ticket;
-        document.getElementById('call-again-btn').disabled = false;
-    } else {
-        document.getElementById('current_ticket').innerText = "No ticket being served";
-        currentTicketId = null;
-        document.getElementById('call-again-btn').disabled = true;
-    }
-
-    var waiting = [];
-    for(var i=0; i < c.categories.length; i++){
-        var cat = c.categories[i];
-        var catQueue = data.queue[cat] || [];
-        for(var j=0; j<catQueue.length; j++){
-            waiting.push(catQueue[j]);
-        }
-    }
-
-    // Next in line is the first waiting item's id (if any)
-    var next = waiting.length > 0 ? waiting[0].id : "None";
-    document.getElementById('next_in_line').innerText = "Next: " + next;
-
-    var qlist = document.getElementById('queue_list');
-    qlist.innerHTML = "";
-    for(var k=0; k<waiting.length; k++){
-        var li = document.createElement("li");
-        li.innerText = waiting[k].id + " (" + waiting[k].category + ")";
-        qlist.appendChild(li);
-    }
-});
-
-function callNext(){
-    socket.emit("call_next", {counter_id: counterId});
-}
-
-function callAgain(){
-    if (currentTicketId) {
-        // Add visual feedback
-        var callAgainBtn = document.getElementById('call-again-btn');
-        callAgainBtn.classList.add('active');
-        
-        // Remove the active class after animation completes
-        setTimeout(function() {
-            callAgainBtn.classList.remove('active');
-        }, 1000);
-        
-        socket.emit("call_again", {
-            counter_id: counterId,
-            ticket_id: currentTicketId
-        });
-    }
-}
-</script>
+<script>var socketOptions = {{ socketio_client_options|tojson }};</script>
+<script src="{{ asset_url('js/socket.io.min.js') }}"></script>
+<script src="{{ asset_url('js/counter.js') }}"></script>
 </body>
 </html>
 """
@@ -1075,109 +787,7 @@ display_template = """
 <head>
 <title>Display | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  padding: 0;
-  color: var(--text);
-  height: 100vh;
-  overflow: hidden;
-}
-.header {
-  background: var(--primary);
-  color: white;
-  padding: 1rem 1.5rem;
-  text-align: center;
-  font-size: 1.75rem;
-  font-weight: 600;
-  box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-  position: relative;
-  z-index: 10;
-}
-.display-container {
-  display: grid;
-  grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-  gap: 1.5rem;
-  padding: 1.5rem;
-  height: calc(100vh - 4.75rem);
-  overflow-y: auto;
-}
-.counter-card {
-  background: var(--card-bg);
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  padding: 1.5rem;
-  display: flex;
-  flex-direction: column;
-  transition: var(--transition);
-  position: relative;
-  overflow: hidden;
-}
-.counter-card:before {
-  content: '';
-  position: absolute;
-  top: 0;
-  left: 0;
-  right: 0;
-  height: 0.25rem;
-  background: var(--primary);
-}
-.counter-name {
-  font-size: 1.5rem;
-  font-weight: 600;
-  color: var(--text);
-  margin-bottom: 1rem;
-  text-align: center;
-  padding-bottom: 0.75rem;
-  border-bottom: 1px solid #e2e8f0;
-}
-.ticket-display {
-  font-size: 4rem;
-  font-weight: 700;
-  color: var(--accent);
-  text-align: center;
-  margin: auto 0;
-  padding: 2rem 0;
-  letter-spacing: -1px;
-  transition: all 0.5s ease;
-}
-.empty-ticket {
-  color: var(--text-light);
-  font-size: 2.5rem;
-  opacity: 0.5;
-}
-.flash {
-  animation: flash 1s;
-}
-@keyframes flash {
-  0%, 100% { background-color: var(--card-bg); }
-  50% { background-color: var(--primary-light); }
-}
-@media (max-width: 768px) {
-  .display-container {
-    grid-template-columns: 1fr;
-  }
-  .ticket-display {
-    font-size: 3rem;
-    padding: 1.5rem 0;
-  }
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/display.css') }}">
 </head>
 <body>
 <div class="header">Proxima Queue Display</div>
@@ -1196,160 +806,12 @@ body {
   {% endfor %}
 </div>
 
-<audio id="ding" src="{{ ding_url }}" preload="auto"></audio>
+<audio id="ding" src="{{ asset_url('ding.mp3') }}" preload="auto"></audio>
 <!-- Add speech synthesis for announcements -->
 
-<script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
-<script>
-var socket = io();
-var ding = document.getElementById('ding');
-// Set lower volume for the ding sound
-ding.volume = 0.4; // 40% volume
-
-socket.emit("join_display_room");
-
-socket.on("display_update", function(data){
-    var countersDiv = document.getElementById('counters');
-    countersDiv.innerHTML = '';
-    
-    for(var i=0; i < data.length; i++){
-        var counter = data[i];
-        var card = document.createElement('div');
-        card.className = 'counter-card';
-        
-        var nameDiv = document.createElement('div');
-        nameDiv.className = 'counter-name';
-        nameDiv.innerText = counter.name;
-        
-        var ticketDiv = document.createElement('div');
-        ticketDiv.className = 'ticket-display';
-        ticketDiv.id = 'counter_' + counter.id;
-        
-        if(counter.current_ticket){
-            ticketDiv.innerText = counter.current_ticket;
-        } else {
-            var span = document.createElement('span');
-            span.className = 'empty-ticket';
-            span.innerText = '-';
-            ticketDiv.appendChild(span);
-        }
-        
-        card.appendChild(nameDiv);
-        card.appendChild(ticketDiv);
-        countersDiv.appendChild(card);
-    }
-});
-
-// Function to announce ticket using speech synthesis
-function announceTicket(ticketId, counterName) {
-    // Format the ticket ID for better pronunciation by spelling out each character
-    let spellOut = '';
-    
-    // Spell out each character with spaces between them
-    for (let i = 0; i < ticketId.length; i++) {
-        // Add a space between characters
-        if (i > 0) {
-            spellOut += ' ';
-        }
-        
-        // Add the character
-        spellOut += ticketId[i];
-    }
-    
-    let announcement = `Ticket ${spellOut}, please proceed to ${counterName}`;
-    console.log("Announcing: " + announcement); // Debug log
-    
-    // Check if browser supports speech synthesis
-    if ('speechSynthesis' in window) {
-        // Create a new speech synthesis utterance
-        let utterance = new SpeechSynthesisUtterance(announcement);
-        utterance.rate = 0.8; // Slower rate for clarity when spelling out
-        utterance.pitch = 1;
-        utterance.volume = 1;
-        
-        // Get available voices and set to a clear voice if available
-        window.speechSynthesis.getVoices();
-        
-        // Wait for the ding sound to complete before speaking
-        setTimeout(() => {
-            console.log("Speaking announcement now");
-            window.speechSynthesis.speak(utterance);
-        }, 1000); // Wait 1 second after the ding starts
-    }
-}
-
-socket.on("ticket_called", function(data){
-    // Always reset and play the ding sound for both Call Next and Call Again
-    try { 
-        // Reset the audio to the beginning
-        ding.pause();
-        ding.currentTime = 0;
-        
-        // Play the ding sound first - force it to play every time
-        var playPromise = ding.play();
-        
-        // If this is the user's ticket being called, mark it as served in localStorage
-        // and set a cookie to prevent refresh-based ticket creation
-        if (data.mark_served) {
-            localStorage.setItem('ticket_served_' + data.id, 'true');
-            
-            // Set a cookie to mark this category as served with proper expiration
-            if (data.category) {
-                // Set cookie with 1 hour expiration and proper path
-                var expirationDate = new Date();
-                expirationDate.setTime(expirationDate.getTime() + (60 * 60 * 1000)); // 1 hour
-                document.cookie = "served_ticket_" + data.category + "=true; expires=" + expirationDate.toUTCString() + "; path=/; SameSite=Lax";
-                console.log("Set served cookie for category:", data.category);
-            }
-            
-            // Show a message that the ticket has been served
-            setTimeout(function() {
-                alert("Your ticket has been served. To get a new ticket, please scan the QR code again.");
-            }, 3000); // Show after 3 seconds to allow announcement to complete
-        }
-        
-        if (playPromise !== undefined) {
-            playPromise.catch(function(e){
-                console.log("Audio play error:", e);
-                // Try playing again with user interaction
-                document.addEventListener('click', function playOnClick() {
-                    ding.play();
-                    document.removeEventListener('click', playOnClick);
-                }, { once: true });
-            });
-        }
-    } catch(e){
-        console.log("Error playing ding sound:", e);
-    }
-    
-    // Announce the ticket vocally AFTER the ding completes
-    // Use the original ticket ID for announcement
-    var ticketToAnnounce = data.id; // Always use the original ticket ID
-    console.log("Ticket called event received. ID:", data.id, "Display ID:", data.display_id);
-    announceTicket(ticketToAnnounce, data.counter_name);
-    
-    var counterElem = document.getElementById('counter_' + data.counter_id);
-    if(counterElem){
-        // Display counter-specific number instead of global ID
-        // Use the display_id from the data object
-        counterElem.innerText = data.display_id || data.id;
-        // Flash effect
-        var card = counterElem.parentElement;
-        card.classList.add('flash');
-        setTimeout(function(){
-            card.classList.remove('flash');
-        }, 1000);
-        
-        // Highlight the ticket
-        counterElem.style.transition = 'all 0.5s ease';
-        counterElem.style.color = getComputedStyle(document.documentElement).getPropertyValue('--accent').trim();
-        counterElem.style.transform = 'scale(1.1)';
-        setTimeout(function(){
-            counterElem.style.transform = 'scale(1)';
-        }, 1000);
-    }
-});
-</script>
+<script>var socketOptions = {{ socketio_client_options|tojson }};</script>
+<script src="{{ asset_url('js/socket.io.min.js') }}"></script>
+<script src="{{ asset_url('js/display.js') }}"></script>
 </body>
 </html>
 """
@@ -1360,209 +822,7 @@ admin_template = """
 <head>
 <title>Admin Dashboard | Proxima</title>
 <meta name="viewport" content="width=device-width,initial-scale=1">
-<style>
-:root {
-  --primary: #2563eb;
-  --primary-dark: #1d4ed8;
-  --primary-light: #dbeafe;
-  --accent: #f97316;
-  --text: #1e293b;
-  --text-light: #64748b;
-  --bg: #f8fafc;
-  --card-bg: #ffffff;
-  --success: #10b981;
-  --danger: #ef4444;
-  --card-shadow: 0 10px 30px rgba(0,0,0,0.08);
-  --transition: all 0.3s ease;
-}
-body {
-  font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-  background: var(--bg);
-  margin: 0;
-  padding: 2rem 1.5rem;
-  color: var(--text);
-}
-.header {
-  display: flex;
-  align-items: center;
-  justify-content: space-between;
-  margin-bottom: 1.5rem;
-  flex-wrap: wrap;
-  gap: 1rem;
-}
-.logo {
-  font-size: 1.5rem;
-  font-weight: 700;
-  color: var(--primary);
-  margin-bottom: 1rem;
-  letter-spacing: -0.5px;
-}
-h1 {
-  color: var(--text);
-  margin: 0;
-  font-size: 1.75rem;
-  font-weight: 600;
-}
-h3 {
-  color: var(--text);
-  margin: 1.5rem 0 1rem;
-  font-size: 1.25rem;
-  font-weight: 600;
-}
-.form {
-  background: var(--card-bg);
-  padding: 1.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-  margin-top: 1rem;
-}
-input[type="text"] {
-  display: block;
-  width: 100%;
-  padding: 0.875rem 1rem;
-  margin: 0 0 1rem;
-  border-radius: 0.5rem;
-  border: 1px solid #e2e8f0;
-  font-size: 1rem;
-  transition: var(--transition);
-  box-sizing: border-box;
-}
-input[type="text"]:focus {
-  outline: none;
-  border-color: var(--primary);
-  box-shadow: 0 0 0 3px var(--primary-light);
-}
-table {
-  width: 100%;
-  border-collapse: collapse;
-  margin-top: 1rem;
-  background: var(--card-bg);
-  border-radius: 1rem;
-  overflow: hidden;
-  box-shadow: var(--card-shadow);
-}
-th {
-  background: var(--primary-light);
-  color: var(--primary-dark);
-  font-weight: 600;
-  text-align: left;
-  padding: 1rem;
-}
-th:first-child {
-  border-top-left-radius: 1rem;
-}
-th:last-child {
-  border-top-right-radius: 1rem;
-}
-th, td {
-  padding: 1rem;
-  border: none;
-  border-bottom: 1px solid #e2e8f0;
-}
-tr:last-child td {
-  border-bottom: none;
-}
-tr:last-child td:first-child {
-  border-bottom-left-radius: 1rem;
-}
-tr:last-child td:last-child {
-  border-bottom-right-radius: 1rem;
-}
-button {
-  padding: 0.625rem 1rem;
-  border-radius: 0.5rem;
-  border: none;
-  background: var(--primary);
-  color: white;
-  cursor: pointer;
-  font-weight: 500;
-  transition: var(--transition);
-  font-size: 0.875rem;
-}
-button:hover {
-  background: var(--primary-dark);
-  transform: translateY(-2px);
-  box-shadow: 0 4px 12px rgba(37, 99, 235, 0.2);
-}
-.checkbox-list {
-  display: flex;
-  flex-wrap: wrap;
-  gap: 0.75rem;
-  margin: 1rem 0;
-}
-.checkbox-list label {
-  background: #f1f5f9;
-  padding: 0.625rem 1rem;
-  border-radius: 0.5rem;
-  border: 1px solid #e2e8f0;
-  display: flex;
-  align-items: center;
-  gap: 0.5rem;
-  cursor: pointer;
-  transition: var(--transition);
-  font-size: 0.875rem;
-}
-.checkbox-list label:hover {
-  border-color: var(--primary);
-  background: var(--primary-light);
-}
-.names-list {
-  margin-top: 1.5rem;
-  background: var(--card-bg);
-  padding: 1.5rem;
-  border-radius: 1rem;
-  box-shadow: var(--card-shadow);
-}
-.clear-btn {
-  background: var(--danger);
-  margin-left: 0.5rem;
-}
-.clear-btn:hover {
-  background: #dc2626;
-}
-.action-btns {
-  display: flex;
-  align-items: center;
-  gap: 0.75rem;
-}
-a {
-  color: var(--primary);
-  text-decoration: none;
-  font-weight: 500;
-  transition: var(--transition);
-  display: inline-flex;
-  align-items: center;
-  gap: 0.375rem;
-}
-a:hover {
-  color: var(--primary-dark);
-  text-decoration: underline;
-}
-.btn-danger {
-    background-color: #e74c3c;
-}
-.btn-danger:hover {
-    background-color: #c0392b;
-}
-.display-btn:before {
-  content: '⤴';
-  font-size: 1.125rem;
-}
-.user-list {
-  display: grid;
-  grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
-  gap: 0.75rem;
-  margin-top: 1rem;
-}
-.user-list li {
-  background: var(--primary-light);
-  color: var(--primary-dark);
-  padding: 0.625rem 1rem;
-  border-radius: 0.5rem;
-  list-style: none;
-  font-size: 0.875rem;
-}
-</style>
+<link rel="stylesheet" href="{{ asset_url('css/admin.css') }}">
 </head>
 <body>
 <div class="logo">Proxima</div>
@@ -1607,49 +867,18 @@ a:hover {
 </table>
 
 <div class="names-list">
-  <h3>Registered Users</h3>
-  {% if names %}
-    <ul class="user-list">
-      {% for name in names %}
-        <li>{{ name }}</li>
-      {% endfor %}
-    </ul>
-  {% else %}
-    <p>No users have registered yet.</p>
-  {% endif %}
+  <div class="names-header">
+    <h3>Registered Users <span id="names_total"></span></h3>
+    <input type="search" id="names_search" placeholder="Search names" autocomplete="off">
+  </div>
+  <div class="user-list" id="names_list"><div id="names_spacer"></div></div>
+  <p id="names_empty" style="display:none">No users have registered yet.</p>
 </div>
 
-<script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
-<script>
-var socket = io();
-// join admin room
-socket.emit("join_admin");
-
-function deleteCounter(id){
-    if(!confirm("Delete counter?")) return;
-    fetch("/admin/delete_counter/"+id, {method:"POST"})
-    .then(()=>{/* server will emit update */});
-}
-
-socket.on("queue_update", function(data){
-    var table = document.getElementById('counter_table');
-    table.innerHTML = "<tr><th>Counter Name</th><th>Services</th><th>Current Ticket</th><th>Counter Link</th><th>Actions</th></tr>";
-    for(var cid in data.counters){
-        var c = data.counters[cid];
-        var row = table.insertRow();
-        row.insertCell(0).innerText = c.name;
-        row.insertCell(1).innerText = c.categories.join(", ");
-        row.insertCell(2).innerText = c.current_ticket || "None";
-        var linkCell = row.insertCell(3);
-        var a = document.createElement('a'); a.href = "/counter/" + cid; a.target="_blank"; a.innerText = "Open Counter";
-        linkCell.appendChild(a);
-        var actions = row.insertCell(4);
-        var btn = document.createElement('button'); btn.innerText = "Delete";
-        btn.onclick = (function(id){ return function(){ deleteCounter(id); }; })(cid);
-        actions.appendChild(btn);
-    }
-});
-</script>
+<script>var socketOptions = {{ socketio_client_options|tojson }};</script>
+<script src="{{ asset_url('js/socket.io.min.js') }}"></script>
+<script src="{{ asset_url('js/queue_state.js') }}"></script>
+<script src="{{ asset_url('js/admin.js') }}"></script>
 </body>
 </html>
 """
@@ -1659,68 +888,7 @@ admin_login_template = """<!DOCTYPE html>
 <head>
     <title>Proxima Admin Login</title>
     <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-        :root {
-            --primary-color: #3498db;
-            --secondary-color: #2980b9;
-            --text-color: #333;
-            --bg-color: #f5f5f5;
-        }
-        body {
-            font-family: Arial, sans-serif;
-            background-color: var(--bg-color);
-            margin: 0;
-            padding: 20px;
-            color: var(--text-color);
-        }
-        .login-container {
-            max-width: 400px;
-            margin: 50px auto;
-            background: white;
-            padding: 30px;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }
-        h1 {
-            color: var(--primary-color);
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        .form-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: bold;
-        }
-        input[type="password"] {
-            width: 100%;
-            padding: 10px;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            font-size: 16px;
-        }
-        button {
-            background-color: var(--primary-color);
-            color: white;
-            border: none;
-            padding: 12px 20px;
-            border-radius: 4px;
-            cursor: pointer;
-            width: 100%;
-            font-size: 16px;
-            transition: background-color 0.3s;
-        }
-        button:hover {
-            background-color: var(--secondary-color);
-        }
-        .error-message {
-            color: #e74c3c;
-            margin-top: 20px;
-            text-align: center;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/admin_login.css') }}">
 </head>
 <body>
     <div class="login-container">
@@ -1739,139 +907,1345 @@ admin_login_template = """<!DOCTYPE html>
 </body>
 </html>"""
 
+# Compiled once at import instead of on every request. render_template() on a
+# Template object still runs the context processors.
+compiled_templates = {
+    "username": app.jinja_env.from_string(username_template),
+    "user": app.jinja_env.from_string(user_template),
+    "ticket_page": app.jinja_env.from_string(ticket_page_template),
+    "counter": app.jinja_env.from_string(counter_template),
+    "display": app.jinja_env.from_string(display_template),
+    "admin": app.jinja_env.from_string(admin_template),
+    "admin_login": app.jinja_env.from_string(admin_login_template),
+}
+
+# ------------------ METRICS ------------------
+
+# Bucket upper bounds of the latency (seconds) and size (bytes) histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+# Bearer token /metrics asks for (unset = open, like most scrape targets)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+class Histogram:
+    """Prometheus-style cumulative histogram over fixed buckets.
+
+    Buckets are allocated up front and observe() is one bisect and two
+    in-place updates. Every greenlet runs on the hub's OS thread and never
+    yields in here, so no lock is needed.
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def render(self, name, labels=""):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{labels} {self.sum}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+# Events with their own emit histograms; anything else is counted as "other"
+METERED_EVENTS = ("queue_delta", "queue_update", "counter_view", "display_update", "ticket_called",
+                  "wait_update", "queue_shift", "other")
+
+call_next_seconds = Histogram(LATENCY_BUCKETS)
+state_encode_seconds = Histogram(LATENCY_BUCKETS)
+broadcast_build_seconds = {event: Histogram(LATENCY_BUCKETS) for event in METERED_EVENTS}
+emit_encode_seconds = {event: Histogram(LATENCY_BUCKETS) for event in METERED_EVENTS}
+emit_payload_bytes = {event: Histogram(SIZE_BUCKETS) for event in METERED_EVENTS}
+http_request_seconds = {"unmatched": Histogram(LATENCY_BUCKETS)}  # route rule -> histogram, filled per route below
+
+class MeteredPacket(socketio_lib.packet.Packet):
+    """Socket.IO packet that records how long each emitted event took to encode and its size.
+
+    The server encodes an emit once however many sockets it goes to, so
+    these are per emit, not per recipient.
+    """
+
+    def encode(self):
+        start = time.perf_counter()
+        encoded = super().encode()
+        if self.packet_type in (socketio_lib.packet.EVENT, socketio_lib.packet.BINARY_EVENT):
+            event = self.data[0] if self.data[0] in emit_encode_seconds else "other"
+            emit_encode_seconds[event].observe(time.perf_counter() - start)
+            emit_payload_bytes[event].observe(len(encoded) if isinstance(encoded, str)
+                                              else sum(len(part) for part in encoded))
+        return encoded
+
+def metric_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    state = published_state
+    rooms = get_room_stats()
+    lines = [
+        "# HELP proxima_waiting_tickets Tickets waiting per category.",
+        "# TYPE proxima_waiting_tickets gauge",
+    ]
+    lines += [f'proxima_waiting_tickets{{category="{metric_label(cat)}"}} {len(waiting)}'
+              for cat, waiting in state.queue.items()]
+    lines += [
+        "# HELP proxima_counter_served_total Tickets called per counter (all workers).",
+        "# TYPE proxima_counter_served_total counter",
+    ]
+    lines += [f'proxima_counter_served_total{{counter_id="{metric_label(cid)}",'
+              f'counter_name="{metric_label(state.counters.get(cid, {}).get("name", ""))}"}} '
+              f'{sum(numbers.values())}'
+              for cid, numbers in state.counter_numbers.items()]
+    lines += [
+        "# HELP proxima_state_seq Sequence number of the last applied state change.",
+        "# TYPE proxima_state_seq gauge",
+        f"proxima_state_seq {state.seq}",
+        "# HELP proxima_sockets_connected Socket.IO connections held by this worker.",
+        "# TYPE proxima_sockets_connected gauge",
+        f"proxima_sockets_connected {rooms['connected']}",
+        "# HELP proxima_room_sockets Sockets per room in this worker (ticket rooms summed up).",
+        "# TYPE proxima_room_sockets gauge",
+        f'proxima_room_sockets{{room="ticket rooms"}} {rooms["ticket_room_sockets"]}',
+    ]
+    lines += [f'proxima_room_sockets{{room="{metric_label(room)}"}} {n}' for room, n in rooms['sockets_per_room'].items()]
+    lines += [
+        "# HELP proxima_ticket_rooms Ticket rooms with at least one socket in this worker.",
+        "# TYPE proxima_ticket_rooms gauge",
+        f"proxima_ticket_rooms {rooms['ticket_rooms']}",
+        "# HELP proxima_call_next_seconds Time to handle one call_next.",
+        "# TYPE proxima_call_next_seconds histogram",
+    ]
+    lines += call_next_seconds.render("proxima_call_next_seconds")
+    lines += [
+        "# HELP proxima_state_encode_seconds Time to encode the full state for joins and resyncs.",
+        "# TYPE proxima_state_encode_seconds histogram",
+    ]
+    lines += state_encode_seconds.render("proxima_state_encode_seconds")
+    for name, family, help_text in (
+            ("proxima_broadcast_build_seconds", broadcast_build_seconds, "Time to build a coalesced broadcast payload."),
+            ("proxima_emit_encode_seconds", emit_encode_seconds, "Time to encode one emitted Socket.IO event."),
+            ("proxima_emit_payload_bytes", emit_payload_bytes, "Encoded size of one emitted Socket.IO event.")):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for event, histogram in family.items():
+            lines += histogram.render(name, f'event="{event}"')
+    lines += [
+        "# HELP proxima_http_request_seconds HTTP request latency per route.",
+        "# TYPE proxima_http_request_seconds histogram",
+    ]
+    for rule, histogram in http_request_seconds.items():
+        lines += histogram.render("proxima_http_request_seconds", f'route="{metric_label(rule)}"')
+    return "\n".join(lines) + "\n"
+
+# ------------------ BROADCASTS ------------------
+
+# Coalescing window for counter/admin/display broadcasts (0 = send immediately)
+BROADCAST_WINDOW = float(os.environ.get("BROADCAST_WINDOW_MS", "100")) / 1000.0
+
+class BroadcastScheduler:
+    """Collapses bursts of mutations into one emission per room per window.
+
+    Deltas are accumulated and sent as a single list; snapshot-style events
+    (like display_update) keep only their builder and are built once at flush
+    time, and so do fan-outs, which build any number of (event, room,
+    payload) messages at once (like the wait updates of one category).
+    ticket_called is not routed through here: it must stay immediate.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._deltas = {}     # room -> [delta, ...]
+        self._snapshots = {}  # (event, room) -> callable building the payload
+        self._fanouts = {}    # (event, key) -> callable building [(event, room, payload), ...]
+        self._flush_scheduled = False
+
+    def add_delta(self, room, delta):
+        self._deltas.setdefault(room, []).append(delta)
+        self._schedule()
+
+    def add_snapshot(self, event, room, build):
+        self._snapshots[(event, room)] = build
+        self._schedule()
+
+    def add_fanout(self, event, key, build):
+        self._fanouts[(event, key)] = build
+        self._schedule()
+
+    def _schedule(self):
+        if self.window <= 0:
+            self.flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        socketio.sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        self._flush_scheduled = False
+        deltas, self._deltas = self._deltas, {}
+        snapshots, self._snapshots = self._snapshots, {}
+        fanouts, self._fanouts = self._fanouts, {}
+        for room, batch in deltas.items():
+            socketio.emit("queue_delta", batch, room=room)
+        for (event, room), build in snapshots.items():
+            start = time.perf_counter()
+            payload = build()
+            broadcast_build_seconds.get(event, broadcast_build_seconds["other"]).observe(time.perf_counter() - start)
+            socketio.emit(event, payload, room=room)
+        for (event, _), build in fanouts.items():
+            start = time.perf_counter()
+            messages = build()
+            broadcast_build_seconds.get(event, broadcast_build_seconds["other"]).observe(time.perf_counter() - start)
+            for message_event, room, payload in messages:
+                socketio.emit(message_event, payload, room=room)
+
+broadcasts = BroadcastScheduler(BROADCAST_WINDOW)
+
+# ------------------ PERSISTENCE ------------------
+
+# Where the journal and snapshot live (point this at a persistent disk on Render)
+DATA_DIR = os.environ.get("PROXIMA_DATA_DIR", "data")
+# How long journal records may sit in memory before being written and fsynced
+JOURNAL_SYNC_INTERVAL = float(os.environ.get("JOURNAL_SYNC_MS", "200")) / 1000.0
+# Compact the journal into a snapshot after this many records
+SNAPSHOT_EVERY = int(os.environ.get("SNAPSHOT_EVERY", "1000"))
+
+class Journal:
+    """Append-only log of state deltas plus periodic compacted snapshots.
+
+    Records are buffered and written with a single fsync per sync interval;
+    the fsync runs in a native thread so the eventlet hub keeps serving.
+    Every SNAPSHOT_EVERY records the full state is written to snapshot.json
+    and the log is truncated. On startup the snapshot is loaded and only the
+    log records newer than it are replayed.
+
+    Only this process appends, and commit_delta reads the state, appends and
+    applies the record without yielding; the write and fsync come after
+    (committed(), or the background sync), so appends never conflict. One
+    sync runs at a time, compaction included: callers arriving while it
+    waits on the disk queue up behind it.
+    """
+
+    def __init__(self, directory, sync_interval, snapshot_every):
+        self.log_path = os.path.join(directory, "journal.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.snapshot_every = snapshot_every
+        self._file = None
+        self._buffer = []  # (seq, line) not yet written
+        self._since_snapshot = 0
+        self._sync_scheduled = False
+        self._sync_lock = Semaphore()
+
+    def load(self):
+        """Return (snapshot or None, [records]) as found on disk."""
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        records = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # torn write from a crash: everything after it is lost anyway
+                        break
+        return snapshot, records
+
+    def open(self, replayed=0):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.log_path, "a", encoding="utf-8")
+        self._since_snapshot = replayed
+
+    def append(self, record):
+        # never writes: the fsync would yield to the hub before the record
+        # is applied, letting other greenlets commit on the same seq
+        self._buffer.append((record['seq'], json.dumps(record, separators=(",", ":"))))
+        if self.sync_interval > 0 and not self._sync_scheduled:
+            self._sync_scheduled = True
+            socketio.start_background_task(self._sync_later)
+
+    def retract(self, seq):
+        """Take back the record just appended (it did not apply); it is still in the buffer."""
+        self._buffer = [(s, line) for s, line in self._buffer if s != seq]
+
+    def committed(self):
+        """Called by commit_delta once the appended record is applied."""
+        if self.sync_interval <= 0:
+            self.sync()
+
+    def _sync_later(self):
+        socketio.sleep(self.sync_interval)
+        self.sync()
+        self._sync_scheduled = False
+        if self._buffer:
+            self._sync_scheduled = True
+            socketio.start_background_task(self._sync_later)
+
+    def sync(self):
+        with self._sync_lock:
+            # whoever held the lock before may have written our records already
+            if not self._buffer or self._file is None:
+                return
+            written, self._buffer = self._buffer, []
+            self._file.write("\n".join(line for _, line in written) + "\n")
+            self._file.flush()
+            tpool.execute(os.fsync, self._file.fileno())
+            self._since_snapshot += len(written)
+            if self._since_snapshot >= self.snapshot_every:
+                self.compact(written)
+
+    def compact(self, written=()):
+        """Write the current state as a snapshot and start a fresh log (called by sync, under its lock).
+
+        Records in `written` that are not applied yet (newer than the
+        snapshot) are carried over into the fresh log.
+        """
+        # the published version never changes, so it is encoded and written
+        # in a native thread while the hub goes on serving new mutations
+        snapshot = published_state
+        tpool.execute(self._write_snapshot, snapshot)
+        # records still buffered are written to the fresh log by the next sync
+        self._file.close()
+        self._file = open(self.log_path, "w", encoding="utf-8")
+        carried = [line for seq, line in written if seq > snapshot.seq]
+        if carried:
+            self._file.write("\n".join(carried) + "\n")
+            self._file.flush()
+        self._since_snapshot = len(carried)
+
+    def _write_snapshot(self, state):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(get_persisted_state(state), f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._buffer:
+            written, self._buffer = self._buffer, []
+            self._file.write("\n".join(line for _, line in written) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def fetch_since(self, seq):
+        # a single process owns this journal, so nobody else appends to it
+        return []
+
+# Every served ticket, also the ones no longer kept in counter_queues
+SERVED_ARCHIVE = os.environ.get("PROXIMA_SERVED_ARCHIVE", os.path.join(DATA_DIR, "served.csv"))
+SERVED_ARCHIVE_FIELDS = ("served_at", "id", "category", "arrival_order", "counter_id", "counter_number")
+
+class ServedArchive:
+    """Append-only CSV with one row per called ticket.
+
+    Written by the worker whose call_next committed the assignment, one
+    O_APPEND write per row, so several workers can share the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def _format(self, row):
+        out = io.StringIO()
+        csv.writer(out).writerow(row)
+        return out.getvalue().encode("utf-8")
+
+    def append(self, ticket):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, self._format(SERVED_ARCHIVE_FIELDS))
+        row = [time.strftime("%Y-%m-%dT%H:%M:%S")] + [getattr(ticket, field) for field in SERVED_ARCHIVE_FIELDS[1:]]
+        os.write(self._fd, self._format(row))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+served_archive = ServedArchive(SERVED_ARCHIVE)
+atexit.register(served_archive.close)
+
+# Ticket numbers: digits after the prefix, how many are reserved per disk
+# write, and "daily" to start numbering over at local midnight (set TZ)
+TICKET_NUMBER_WIDTH = int(os.environ.get("TICKET_NUMBER_WIDTH", "3"))
+TICKET_NUMBER_BLOCK = int(os.environ.get("TICKET_NUMBER_BLOCK", "100"))
+TICKET_NUMBER_RESET = os.environ.get("TICKET_NUMBER_RESET", "never")
+TICKET_NUMBERS_FILE = os.path.join(DATA_DIR, "ticket_numbers.log")
+
+class TicketNumbers:
+    """Hands out ticket numbers per category from blocks reserved on disk.
+
+    The journal reaches the disk up to JOURNAL_SYNC_MS after a ticket is
+    issued, so after a crash the restored state can miss the last numbers
+    students were given. A number is only issued once a block holding it is
+    recorded (one fsynced line per TICKET_NUMBER_BLOCK numbers, written
+    ahead in a native thread), and a restart continues after the last
+    reserved block. The first block of every category is recorded on
+    startup, and with daily numbering the next day's a minute before
+    midnight, so issuing a ticket is a dict lookup that never waits on the
+    disk (ids in reserved blocks are formatted ahead too).
+
+    Each reservation is a {"day", "category", "reserved"} line appended to
+    one file; the highest one per category for the current day counts. A
+    clean shutdown (journal flushed first) rewrites the file with the
+    numbers actually issued, so only a crash leaves a gap in the numbering.
+    With path None (sqlite backend, which stores each ticket before it is
+    shown) nothing is written and only the ids are prepared.
+    """
+
+    def __init__(self, path, block, width, daily):
+        self.path = path
+        self.block = block
+        self.width = width
+        self.daily = daily
+        self.day = None
+        self._fd = None
+        self._today = None
+        self._day_ends = 0
+        self._reserved = {}  # category -> highest number recorded on disk
+        self._floor = {}     # category -> highest number an earlier run may have issued
+        self._issued = {}    # category -> last number handed out by this run
+        self._ids = {}       # category -> {number: ticket id formatted ahead}
+        self._topping_up = set()
+        self._next_day = None  # (day, {category: reserved}) recorded ahead of midnight
+
+    def today(self):
+        """The current numbering day, or None unless numbering resets daily."""
+        if not self.daily:
+            return None
+        now = time.time()
+        if now >= self._day_ends:
+            t = time.localtime(now)
+            self._today = time.strftime("%Y-%m-%d", t)
+            self._day_ends = time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        return self._today
+
+    def load(self):
+        """Pick up today's reservations from earlier runs and rewrite the file with the next block of each."""
+        day = self.today()
+        floor = {}
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash
+                    if record['day'] == day:
+                        cat = record['category']
+                        floor[cat] = max(floor.get(cat, 0), record['reserved'])
+        first = {cat: floor.get(cat, 0) + self.block for cat in ticket_prefixes}
+        if self.path is not None:
+            self._rewrite(day, first)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._start_day(day, first, floor)
+        if self.daily:
+            socketio.start_background_task(self._reserve_next_days)
+
+    def _rewrite(self, day, reserved):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(self._line(day, cat, n) for cat, n in reserved.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _start_day(self, day, reserved=None, floor=None):
+        """Number `day` from after `floor`, with the blocks `reserved` already recorded for it."""
+        self.day = day
+        self._reserved, self._floor, self._issued, self._ids = {}, dict(floor or {}), {}, {}
+        for cat, target in (reserved or {}).items():
+            self._reserved_up_to(cat, self._floor.get(cat, 0), target)
+
+    def _reserve_next_days(self):
+        """A minute before each midnight, record the next day's first blocks."""
+        while True:
+            self.today()
+            socketio.sleep(max(self._day_ends - 60 - time.time(), 0))
+            day = time.strftime("%Y-%m-%d", time.localtime(self._day_ends + 1))
+            first = {cat: self.block for cat in ticket_prefixes}
+            tpool.execute(self._write, day, first)
+            self._next_day = (day, first)
+            socketio.sleep(max(self._day_ends - time.time(), 0) + 1)
+
+    def format(self, category, number):
+        return f"{ticket_prefixes[category]}-{number:0{self.width}d}"
+
+    def allocate(self, category, last):
+        """Return (number, ticket id) for the ticket after number `last` of the current day.
+
+        Numbers whose id still belongs to a waiting ticket (one held on a
+        phone from before a reset, say) are skipped. Today's own tickets
+        are all numbered up to `last`, and called tickets of earlier days
+        no longer need their id, so they do not block a number.
+        """
+        day = self.today()
+        if day != self.day:
+            ahead = self._next_day
+            self._start_day(day, ahead[1] if ahead and ahead[0] == day else None)
+        ids = self._ids.setdefault(category, {})
+        number = max(last, self._floor.get(category, 0)) + 1
+        tid = ids.pop(number, None) or self.format(category, number)
+        while get_waiting_ticket(tid) is not None:
+            number += 1
+            tid = ids.pop(number, None) or self.format(category, number)
+        reserved = self._reserved.get(category, 0)
+        if number > reserved:
+            # the reservation ahead did not land in time: record a block now
+            self._write(day, {category: number + self.block - 1})
+            self._reserved_up_to(category, number, number + self.block - 1)
+        elif reserved - number < self.block // 2 and category not in self._topping_up:
+            self._topping_up.add(category)
+            socketio.start_background_task(self._top_up, day, category, reserved + self.block)
+        self._issued[category] = number
+        return number, tid
+
+    def _top_up(self, day, category, target):
+        try:
+            tpool.execute(self._write, day, {category: target})
+            if day == self.day:
+                self._reserved_up_to(category, self._reserved.get(category, 0), target)
+        finally:
+            self._topping_up.discard(category)
+
+    def _reserved_up_to(self, category, issued, target):
+        ids = self._ids.setdefault(category, {})
+        for number in range(max(issued, self._reserved.get(category, 0)) + 1, target + 1):
+            ids[number] = self.format(category, number)
+        self._reserved[category] = max(self._reserved.get(category, 0), target)
+
+    def _line(self, day, category, reserved):
+        return json.dumps({"day": day, "category": category, "reserved": reserved}) + "\n"
+
+    def _write(self, day, reserved):
+        if self._fd is not None:
+            os.write(self._fd, "".join(self._line(day, cat, n) for cat, n in reserved.items()).encode("utf-8"))
+            os.fsync(self._fd)
+
+    def close(self):
+        """Keep only the numbers issued; the journal (closed before this) has them all."""
+        if self._fd is None:
+            return
+        os.close(self._fd)
+        self._fd = None
+        self._rewrite(self.day, {**self._floor, **self._issued})
+
+# ------------------ STATE BACKENDS ------------------
+
+# "memory" keeps state in this process (journaled to DATA_DIR); "sqlite" shares
+# it between several workers through one database file.
+STATE_BACKEND = os.environ.get("PROXIMA_STATE_BACKEND", "memory")
+SQLITE_PATH = os.environ.get("PROXIMA_SQLITE_PATH", os.path.join(DATA_DIR, "proxima.db"))
+# Socket.IO message queue so every worker can reach every socket:
+# sqlite:///path/to.db for a local stand-in, or a redis:// / amqp:// URL
+# (which needs that client library installed).
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+
+# How long a statement waits for another worker's lock before failing
+SQLITE_BUSY_TIMEOUT = 5.0
+
+class GreenConnection(sqlite3.Connection):
+    """A connection that waits for other workers' locks in green sleeps.
+
+    SQLite's own busy handler sleeps in C and would stall the whole hub, so
+    connections get no busy timeout and execute() retries "database is
+    locked" itself, letting the other greenlets run in between.
+    """
+
+    def execute(self, sql, parameters=()):
+        deadline = time.monotonic() + SQLITE_BUSY_TIMEOUT
+        delay = 0.001
+        while True:
+            try:
+                return super().execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() >= deadline:
+                    raise
+            eventlet.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+def connect_sqlite(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None, factory=GreenConnection)
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+        conn.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode this only fsyncs at checkpoints, batching writes like the journal
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class SQLiteBackend:
+    """Shared, durable state log in SQLite (WAL mode) for several workers.
+
+    Every worker still keeps the whole state in memory and catches up by
+    applying whatever other workers appended (sync_state). Appends are a
+    compare-and-swap on the log head: record N+1 is only inserted if no
+    record >= N+1 exists yet, so when two workers both try to commit it
+    only one succeeds and the other gets StaleStateError and retries on the
+    fresh state. (The check can't rely on the primary key alone: a worker
+    blocked on the write lock could otherwise re-insert a seq that other
+    workers committed and compaction already deleted.)
+    Every snapshot_every records a snapshot is stored and older records are
+    dropped, keeping a tail so briefly idle workers can still catch up.
+    Waiting for the write lock yields to the hub (see GreenConnection): in
+    append that is safe, since a greenlet that commits meanwhile takes the
+    seq and the insert fails; compaction waits until the record is applied.
+    """
+
+    def __init__(self, path, snapshot_every):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._conn = None
+        self._since_snapshot = 0
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute("CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, record TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS snapshots (seq INTEGER PRIMARY KEY, state TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def load(self):
+        conn = self._connect()
+        # one read transaction, so a concurrent compaction can't drop records between the two reads
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT state FROM snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+            snapshot = json.loads(row[0]) if row else None
+            return snapshot, self.fetch_since(snapshot['seq'] if snapshot else 0)
+        finally:
+            conn.execute("COMMIT")
+
+    def open(self, replayed=0):
+        self._connect()
+        self._since_snapshot = replayed
+
+    def append(self, record):
+        # compaction always keeps the newest record, so "nothing at or above seq" means we hold the head
+        inserted = self._connect().execute(
+            "INSERT INTO events (seq, record) SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM events WHERE seq >= ?)",
+            (record['seq'], json.dumps(record, separators=(",", ":")), record['seq'])).rowcount
+        if not inserted:
+            raise StaleStateError(f"seq {record['seq']} was committed by another worker")
+        self._since_snapshot += 1
+
+    def fetch_since(self, seq):
+        rows = self._connect().execute("SELECT record FROM events WHERE seq > ? ORDER BY seq", (seq,))
+        return [json.loads(record) for (record,) in rows]
+
+    def compact(self):
+        # encode the published version before taking the write lock
+        state = published_state
+        encoded = json.dumps(get_persisted_state(state), separators=(",", ":"))
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO snapshots (seq, state) VALUES (?, ?)", (state.seq, encoded))
+            conn.execute("DELETE FROM snapshots WHERE seq < ?", (state.seq,))
+            conn.execute("DELETE FROM events WHERE seq <= ?", (state.seq - self.snapshot_every,))
+        self._since_snapshot = 0
+
+    def sync(self):
+        pass
+
+    def retract(self, seq):
+        self._connect().execute("DELETE FROM events WHERE seq = ?", (seq,))
+        self._since_snapshot -= 1
+
+    def committed(self):
+        # the INSERT in append is the commit; compact once the record is applied and published
+        if self._since_snapshot >= self.snapshot_every:
+            self.compact()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class SQLiteMessageQueue(socketio_lib.PubSubManager):
+    """Socket.IO pub/sub over a SQLite table: a broker-free stand-in for Redis.
+
+    Emits are inserted as rows and each worker polls for rows newer than
+    the last one it has seen; rows older than `retention` seconds are pruned.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, channel='flask-socketio', write_only=False, logger=None,
+                 json=None, poll_interval=0.02, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._conn = None
+        self._published = 0
+        self._last_id = None  # kept across _listen restarts, so no emit is skipped
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute("CREATE TABLE IF NOT EXISTS socketio_messages ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                         "created REAL NOT NULL, data TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _publish(self, data):
+        conn = self._connect()
+        conn.execute("INSERT INTO socketio_messages (channel, created, data) VALUES (?, ?, ?)",
+                     (self.channel, time.time(), self.json.dumps(data)))
+        self._published += 1
+        if self._published % 500 == 0:
+            conn.execute("DELETE FROM socketio_messages WHERE created < ?", (time.time() - self.retention,))
+
+    def _listen(self):
+        conn = self._connect()
+        if self._last_id is None:
+            self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_messages").fetchone()[0]
+        while True:
+            rows = conn.execute("SELECT id, data FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id",
+                                (self._last_id, self.channel)).fetchall()
+            for self._last_id, data in rows:
+                yield data
+            if not rows:
+                eventlet.sleep(self.poll_interval)
+
+def socketio_queue_options():
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith("sqlite:///"):
+        return {"client_manager": SQLiteMessageQueue(SOCKETIO_MESSAGE_QUEUE[len("sqlite:///"):])}
+    return {"message_queue": SOCKETIO_MESSAGE_QUEUE}
+
+if STATE_BACKEND == "sqlite":
+    state_backend = SQLiteBackend(SQLITE_PATH, SNAPSHOT_EVERY)
+    name_store = SQLiteNameStore(SQLITE_PATH)
+elif STATE_BACKEND == "memory":
+    state_backend = Journal(DATA_DIR, JOURNAL_SYNC_INTERVAL, SNAPSHOT_EVERY)
+    name_store = NameStore(NAMES_FILE)
+else:
+    raise ValueError(f"Unknown PROXIMA_STATE_BACKEND: {STATE_BACKEND}")
+
+ticket_numbers = TicketNumbers(TICKET_NUMBERS_FILE if STATE_BACKEND == "memory" else None,
+                               TICKET_NUMBER_BLOCK, TICKET_NUMBER_WIDTH, TICKET_NUMBER_RESET == "daily")
+atexit.register(ticket_numbers.close)
+
+socketio.init_app(app, serializer=MeteredPacket, **socketio_queue_options())
+# after init_app: with daily numbering it starts a background task
+ticket_numbers.load()
+
 # ------------------ LOGIC ------------------
 
 
 
+def run_mutation(mutate, *args, **kwargs):
+    """Run mutate() on the latest state, retrying whenever another worker commits first.
+
+    mutate must not have side effects before its commit_delta call.
+    """
+    for _ in range(MUTATION_ATTEMPTS):
+        sync_state()
+        try:
+            return mutate(*args, **kwargs)
+        except StaleStateError:
+            continue
+    raise StaleStateError(f"gave up after {MUTATION_ATTEMPTS} attempts")
+
 def generate_ticket(category):
-    global global_arrival_counter
-    global_arrival_counter += 1
-    
-    # Simply increment the category counter for new tickets
-    # This preserves existing ticket numbers and just continues from where we left off
-    category_counters[category] += 1
-    next_number = category_counters[category]
-    
-    tid = f"{ticket_prefixes[category]}-{next_number:03d}"
-    
-    # Create ticket with category and arrival order
-    ticket = {
-        "id": tid, 
-        "category": category, 
-        "arrival_order": global_arrival_counter,
-        "counter_id": None,  # Will be assigned when a counter calls this ticket
-        "counter_number": None  # Will be assigned a counter-specific number
-    }
-    
-    # Add to the category queue and sort by arrival_order to ensure FIFO
-    queue[category].append(ticket)
-    queue[category].sort(key=lambda x: x['arrival_order'])
-    
-    # Notify counters and admin
-    socketio.emit("queue_update", get_full_state(), room="all_counters")
+    return run_mutation(add_ticket, category)
+
+def add_ticket(category):
+    # Continue from the category's last number (of today, with daily reset)
+    day = ticket_numbers.today()
+    last = category_counters[category] if day == numbering_day else 0
+    next_number, tid = ticket_numbers.allocate(category, last)
+
+    # Create ticket with category and arrival order (counter fields are set when it is called)
+    ticket = Ticket.new(tid, category, global_arrival_counter + 1)
+
+    # Add to the category queue and notify counters and admin
+    commit_delta("ticket_added", ticket=ticket.to_wire(), number=next_number, day=day)
     return ticket
 
 def get_display_state():
-    return list(counters.values())
-
-def get_full_state():
-    # Copy main category queues
-    qcopy = {cat: [t.copy() for t in lst] for cat, lst in queue.items()}
-    
-    # Copy counter-specific queues
-    counter_queues_copy = {}
-    for cid, cat_queues in counter_queues.items():
-        counter_queues_copy[cid] = {cat: [t.copy() for t in tickets] for cat, tickets in cat_queues.items()}
-    
-    # Copy counters
-    ccopy = {cid: c.copy() for cid, c in counters.items()}
-    
+    return list(published_state.counters.values())
+
+def apply_delta(delta):
+    """Apply one state change to the in-memory state.
+
+    This is the only place queue, counters and the registry are mutated, so
+    live mutations and journal replay on startup go through the same code.
+    """
+    global global_arrival_counter, numbering_day
+    event_type = delta['type']
+    if event_type == "ticket_added":
+        ticket = Ticket.from_wire(delta['ticket'])
+        category = ticket.category
+        # Arrival order only ever increases, so appending keeps the queue FIFO
+        queue[category].append(ticket)
+        ticket_registry[ticket.id] = {"ticket": ticket, "state": TICKET_WAITING}
+        global_arrival_counter = max(global_arrival_counter, ticket.arrival_order)
+        if delta.get('day') != numbering_day:
+            # first ticket of a new day: every category starts over
+            numbering_day = delta.get('day')
+            for cat in category_counters:
+                category_counters[cat] = 0
+        category_counters[category] = max(category_counters[category], delta['number'])
+        _changed_categories.add(category)
+    elif event_type == "ticket_assigned":
+        ticket = Ticket.from_wire(delta['ticket'])
+        counter_id, category = ticket.counter_id, ticket.category
+        if 'at' in delta:
+            service_times.called(ticket, delta['at'], global_arrival_counter)
+        queue[category].remove(ticket.id)
+        counter_numbers.setdefault(counter_id, {})[category] = ticket.counter_number
+        served = counter_queues.get(counter_id)
+        if served is None:
+            served = counter_queues[counter_id] = deque(maxlen=COUNTER_HISTORY)
+        if len(served) == served.maxlen:
+            # falling out of the history: nothing looks it up any more
+            forget_ticket(served[0])
+        served.append(ticket)
+        if counter_id in counters:
+            # counter records are replaced, not mutated: published versions share them
+            counters[counter_id] = dict(counters[counter_id], current_ticket=ticket.id)
+        ticket_registry[ticket.id] = {"ticket": ticket, "state": TICKET_CALLED}
+        _changed_categories.add(category)
+        _changed_counters.add(counter_id)
+    elif event_type == "ticket_removed":
+        removed = queue[delta['category']].remove(delta['id'])
+        if removed is not None:
+            forget_ticket(removed)
+        _changed_categories.add(delta['category'])
+    elif event_type == "counter_changed":
+        if delta['counter'] is None:
+            # a deleted counter takes its numbers and served history with it
+            counters.pop(delta['counter_id'], None)
+            counter_numbers.pop(delta['counter_id'], None)
+            for ticket in counter_queues.pop(delta['counter_id'], ()):
+                forget_ticket(ticket)
+            service_times.forget(delta['counter_id'])
+        else:
+            counters[delta['counter_id']] = dict(delta['counter'])
+            if delta['counter'].get('current_ticket') is None:
+                service_times.idle(delta['counter_id'])
+        _changed_counters.add(delta['counter_id'])
+
+def publish_state():
+    """Publish the live state as a new StateVersion, sharing the parts no delta touched."""
+    global published_state
+    previous = published_state
+    waiting = previous.queue
+    if _changed_categories:
+        waiting = dict(waiting)
+        for cat in _changed_categories:
+            waiting[cat] = queue[cat].line
+    counters_copy, histories, numbers = previous.counters, previous.counter_queues, previous.counter_numbers
+    if _changed_counters:
+        counters_copy = dict(counters)
+        histories = {cid: tuple(served) if cid in _changed_counters else histories[cid]
+                     for cid, served in counter_queues.items()}
+        numbers = {cid: dict(by_category) if cid in _changed_counters else numbers[cid]
+                   for cid, by_category in counter_numbers.items()}
+    published_state = StateVersion(
+        state_seq, waiting, counters_copy, histories, global_arrival_counter,
+        dict(category_counters) if _changed_categories else previous.category_counters,
+        numbering_day, numbers, service_times.to_wire())
+    _changed_categories.clear()
+    _changed_counters.clear()
+    return published_state
+
+class StaleStateError(Exception):
+    """Another worker committed the next state record first."""
+
+# How many times a mutation is retried on fresh state before giving up
+MUTATION_ATTEMPTS = 50
+
+def commit_delta(event_type, **data):
+    """Persist, apply and broadcast one state change as record state_seq + 1.
+
+    Deltas carry a monotonically increasing seq; a client that sees a gap
+    emits request_resync and gets a full queue_update snapshot instead.
+    Raises StaleStateError (before changing anything) if that seq is taken.
+    Nothing before the final state_backend.committed() may yield to the hub:
+    other greenlets would read the same state and claim the same seq (the
+    SQLite append may, as its insert fails once the seq is taken).
+    A record that fails to apply is taken back out of the log (replaying it
+    would fail the same way on startup) and the state as last published is
+    put back, so the next commit reuses its seq.
+    """
+    global state_seq
+    data['type'] = event_type
+    data['seq'] = state_seq + 1
+    state_backend.append(data)
+    previous = published_state
+    try:
+        if event_type == "ticket_removed":
+            removed = ticket_registry[data['id']]['ticket']  # apply_delta forgets it
+        apply_delta(data)
+    except Exception:
+        reset_state()
+        load_snapshot(get_persisted_state(previous))
+        publish_state()
+        state_backend.retract(data['seq'])
+        raise
+    state_seq = data['seq']
+    publish_state()
+    broadcasts.add_delta("all_counters", data)
+
+    # counter pages only get a fresh view of the slice they render
+    if event_type == "counter_changed":
+        counter_id = data['counter_id']
+        refresh_counter_views(counter_id=counter_id)
+        # the counter's pace now counts for other categories
+        refresh_wait_updates(cat for c in (previous.counters.get(counter_id), counters.get(counter_id)) if c
+                             for cat in c['categories'])
+    else:
+        ticket = data.get('ticket')
+        category = ticket['category'] if ticket else data['category']
+        counter_id = ticket and ticket.get('counter_id')
+        refresh_counter_views(category=category, counter_id=counter_id)
+        if event_type == "ticket_removed":
+            _pending_removals.setdefault(category, []).append([data['seq'], removed.arrival_order])
+            refresh_wait_updates([category])
+        elif event_type == "ticket_assigned":
+            # everyone behind moved up, and the counter's pace changed
+            _pending_removals.setdefault(category, []).append([data['seq'], ticket['arrival_order']])
+            refresh_wait_updates([category, *counters.get(counter_id, {}).get('categories', ())])
+        # a new ticket moves nobody: its page gets its wait when it joins its room
+
+    # may fsync (and yield) now that the state and seq have moved on
+    state_backend.committed()
+
+def counter_room(counter_id):
+    return f"counter:{counter_id}"
+
+def waiting_room(category):
+    return f"waiting:{category}"
+
+def get_waiting_view(categories):
+    """The first COUNTER_VIEW_HEAD tickets across these categories in arrival order, their total and
+    who is next, as JSON object members.
+
+    A lazy k-way merge stops after the head, so this costs the same for 10
+    or 100k waiting; the text is cached per category set, so counters
+    serving the same categories share one encoding.
+    """
+    key = tuple(categories)
+    view = _waiting_views.get(key)
+    if view is None:
+        waiting = published_state.queue
+        lines = [waiting[cat] for cat in key if cat in waiting]
+        head = list(islice(heapq.merge(*lines, key=lambda t: t.arrival_order), COUNTER_VIEW_HEAD))
+        tickets = ",".join(f'{{"id":{json_string(t.id)},"category":{CATEGORY_JSON[t.category_code]}}}'
+                           for t in head)
+        view = (f'"waiting":[{tickets}],"waiting_count":{sum(map(len, lines))},'
+                f'"next":{json_string(head[0].id) if head else "null"}')
+        _waiting_views[key] = view
+    return view
+
+def build_counter_view(counter_id):
+    """The slice of state a counter page renders: its own record, the head of its waiting line and
+    who is next, as UTF-8 JSON bytes (sent as a binary payload, like queue_update)."""
+    counter = published_state.counters.get(counter_id)
+    if not counter:
+        return b'{"counter":null,"waiting":[],"waiting_count":0,"next":null}'
+    record = json.dumps(counter, separators=(",", ":"))
+    return f'{{"counter":{record},{get_waiting_view(counter["categories"])}}}'.encode("utf-8")
+
+def refresh_counter_views(category=None, counter_id=None):
+    """Schedule a counter_view for the given counter and every counter serving the category."""
+    if category is not None:
+        for key in [key for key in _waiting_views if category in key]:
+            del _waiting_views[key]
+    for cid, c in counters.items():
+        if cid == counter_id or category in c['categories']:
+            broadcasts.add_snapshot("counter_view", counter_room(cid), partial(build_counter_view, cid))
+    if counter_id is not None and counter_id not in counters:
+        # deleted counter: let its open pages clear themselves
+        broadcasts.add_snapshot("counter_view", counter_room(counter_id), partial(build_counter_view, counter_id))
+
+def wait_per_place(category, state=None):
+    """Expected seconds per place in the category's line, or None if no counter serves it.
+
+    The category's own call interval once there is one; until then the
+    combined pace of the counters serving it.
+    """
+    state = state or published_state
+    times = state.service_times
+    paces = [times['counters'].get(cid, (None,))[0] or SERVICE_TIME_DEFAULT
+             for cid, c in state.counters.items() if category in c['categories']]
+    if not paces:
+        return None
+    interval = times['categories'].get(category, (None,))[0]
+    return interval if interval is not None else 1 / sum(1 / pace for pace in paces)
+
+# Most tickets told their new place one by one; when more move at once,
+# a single queue_shift to the category's waiting room replaces their updates
+QUEUE_SHIFT_MIN = int(os.environ.get("QUEUE_SHIFT_MIN", "8"))
+
+def wait_payload(ticket_id, position, per_place, seq):
+    return {"id": ticket_id, "position": position, "seq": seq,
+            "eta": None if per_place is None else round(position * per_place)}
+
+def get_ticket_wait(ticket_id):
+    """wait_update payload of a waiting ticket: place in line (from 1), ETA in seconds (or None) and seq."""
+    ticket = get_waiting_ticket(ticket_id)
+    if ticket is None:
+        return None
+    state = published_state
+    category = ticket.category
+    per_place = wait_per_place(category, state)
+    if _sent_per_place.get(category, per_place) != per_place:
+        # this phone hears a pace the others have not been told yet: make
+        # the next build of the category resend it even if it changes back
+        del _sent_per_place[category]
+    return wait_payload(ticket.id, state.queue[category].rank(ticket.arrival_order) + 1, per_place, state.seq)
+
+def build_wait_updates(category):
+    """What the category's waiting phones need to hear since the last flush, as (event, room, payload).
+
+    Tickets ahead of every removal keep their place and hear nothing, unless
+    the pace (seconds per place) changed. Up to QUEUE_SHIFT_MIN tickets that
+    moved get a wait_update each; beyond that one queue_shift lists the
+    removals ([seq, arrival_order]) and the pace, and every phone counts,
+    once each, the removals ahead of it newer than its last wait_update.
+    """
+    state = published_state
+    line = state.queue[category]
+    removed = _pending_removals.pop(category, [])
+    per_place = wait_per_place(category, state)
+    if category not in _sent_per_place or _sent_per_place[category] != per_place:
+        _sent_per_place[category] = per_place
+        start = 0  # every ETA moved
+    elif removed:
+        start = line.rank(min(order for _, order in removed))
+    else:
+        return []
+    moved = len(line) - start
+    if moved <= QUEUE_SHIFT_MIN:
+        return [("wait_update", t.id, wait_payload(t.id, position, per_place, state.seq))
+                for position, t in enumerate(line.tail(moved), start + 1)]
+    return [("queue_shift", waiting_room(category), {
+        "category": category, "removed": removed,
+        "per_place": None if per_place is None else round(per_place, 1)})]
+
+def refresh_wait_updates(categories):
+    """Schedule the wait updates of these categories (built once per category per flush)."""
+    for cat in set(categories):
+        if cat in queue:
+            broadcasts.add_fanout("wait_update", cat, partial(build_wait_updates, cat))
+
+def get_full_state(state=None):
+    """The whole state as sent to counters/admin (see get_encoded_state for the wire bytes)."""
+    state = state or published_state
     return {
-        "queue": qcopy, 
-        "counters": ccopy,
-        "counter_queues": counter_queues_copy
+        "queue": {cat: [t.to_wire() for t in waiting] for cat, waiting in state.queue.items()},
+        "counters": state.counters,
+        "counter_queues": {cid: [t.to_wire() for t in served] for cid, served in state.counter_queues.items()},
+        "counter_history": COUNTER_HISTORY,
+        "seq": state.seq
     }
 
+def peek_next_category(categories):
+    """Return the category whose head ticket arrived first, or None if all are empty.
+
+    Each category queue is already in arrival order, so this is a k-way merge
+    step over the queue heads: O(k) in the number of categories a counter
+    serves, independent of how many tickets are waiting.
+    """
+    earliest_category = None
+    earliest_order = None
+    for cat in categories:
+        waiting = queue.get(cat)
+        head = waiting.peek() if waiting is not None else None
+        if head is not None and (earliest_order is None or head.arrival_order < earliest_order):
+            earliest_order = head.arrival_order
+            earliest_category = cat
+    return earliest_category
+
+def get_encoded_state():
+    """Return the full state as UTF-8 JSON bytes, encoded at most once per state_seq.
+
+    Sent as a binary payload so every join/resync between two mutations
+    reuses the same bytes instead of re-encoding the whole state per socket.
+    """
+    state = published_state
+    if _encoded_state['seq'] != state.seq:
+        start = time.perf_counter()
+        _encoded_state['data'] = encode_full_state(state).encode("utf-8")
+        _encoded_state['seq'] = state.seq
+        state_encode_seconds.observe(time.perf_counter() - start)
+    return _encoded_state['data']
+
+def encode_ticket_lists(lists):
+    """{key: [Ticket, ...]} as a JSON object, each ticket written by Ticket.to_json."""
+    return "{" + ",".join(f"{json_string(key)}:[{','.join(t.to_json() for t in tickets)}]"
+                          for key, tickets in lists.items()) + "}"
+
+def encode_full_state(state=None):
+    """get_full_state() as JSON text, without building an intermediate dict per ticket."""
+    state = state or published_state
+    return (f'{{"queue":{encode_ticket_lists(state.queue)},'
+            f'"counters":{json.dumps(state.counters, separators=(",", ":"))},'
+            f'"counter_queues":{encode_ticket_lists(state.counter_queues)},'
+            f'"counter_history":{COUNTER_HISTORY},"seq":{state.seq}}}')
+
+def claim_next_ticket(counter_id):
+    """Atomically assign the earliest waiting ticket of the counter's categories to it.
+
+    The claim is computed from the state at seq N and only lands if it is
+    committed as record N+1 (see commit_delta), so two counters can never be
+    handed the same ticket; run it through run_mutation to retry on conflict.
+    Returns the claimed ticket, or None if nothing is waiting.
+    """
+    counter = counters.get(counter_id)
+    if not counter:
+        return None
+
+    # Find the earliest ticket across all categories this counter handles
+    earliest_category = peek_next_category(counter['categories'])
+    if not earliest_category:
+        if counter['current_ticket'] is not None:
+            commit_delta("counter_changed", counter_id=counter_id, counter=dict(counter, current_ticket=None))
+        return None
+
+    # Assign counter-specific number
+    counter_number = counter_numbers.get(counter_id, {}).get(earliest_category, 0) + 1
+
+    # Called record of the ticket with counter assignment and counter-specific
+    # number (display_id keeps the original ticket ID for display and announcement)
+    earliest_ticket = queue[earliest_category].peek().assign(counter_id, counter_number)
+
+    # Move it from the category queue to the counter-specific queue and
+    # make it the counter's current ticket; update all counters/admin
+    commit_delta("ticket_assigned", ticket=earliest_ticket.to_wire(), at=time.time())
+    return earliest_ticket
+
 def call_next_ticket(counter_id):
+    earliest_ticket = run_mutation(claim_next_ticket, counter_id)
+    if earliest_ticket:
+        served_archive.append(earliest_ticket)
     counter = counters.get(counter_id)
     if not counter:
         return
-    
-    # Initialize counter-specific queues and numbering if not already done
-    if counter_id not in counter_queues:
-        counter_queues[counter_id] = {cat: [] for cat in counter['categories']}
-    if counter_id not in counter_numbers:
-        counter_numbers[counter_id] = {cat: 0 for cat in counter['categories']}
-        
-    # Find the earliest ticket across all categories this counter handles
-    earliest_ticket = None
-    earliest_category = None
-    earliest_order = float('inf')
-    
-    for cat in counter['categories']:
-        if queue.get(cat) and len(queue[cat]) > 0:
-            # Sort the queue by arrival_order to ensure FIFO (defensive programming)
-            queue[cat].sort(key=lambda x: x['arrival_order'])
-            
-            # Check if this category has a ticket with earlier arrival order
-            if queue[cat][0]['arrival_order'] < earliest_order:
-                earliest_order = queue[cat][0]['arrival_order']
-                earliest_ticket = queue[cat][0].copy()  # Make a copy to avoid reference issues
-                earliest_category = cat
-    
-    # Process the earliest ticket if found
-    if earliest_ticket and earliest_category:
-        try:
-            # Remove the ticket from the main category queue
-            queue[earliest_category].remove(next(t for t in queue[earliest_category] if t['id'] == earliest_ticket['id']))
-            
-            # Assign counter-specific number
-            counter_numbers[counter_id][earliest_category] += 1
-            counter_number = counter_numbers[counter_id][earliest_category]
-            
-            # Update ticket with counter assignment and counter-specific number
-            earliest_ticket['counter_id'] = counter_id
-            earliest_ticket['counter_number'] = counter_number
-            # Keep the original ticket ID for display and announcement
-            earliest_ticket['display_id'] = earliest_ticket['id']
-            
-            # Add to counter-specific queue
-            counter_queues[counter_id][earliest_category].append(earliest_ticket)
-            
-            # Update counter's current ticket
-            counter['current_ticket'] = earliest_ticket['id']
-            
-        except (ValueError, KeyError, StopIteration) as e:
-            # Handle case where ticket might have been removed by another process
-            print(f"Error processing ticket: {e}")
-            return
-            
+
+    if earliest_ticket:
         # Notify the user who holds this ticket (room with ticket id)
         socketio.emit("ticket_called", {
-            "id": earliest_ticket['id'], 
+            "id": earliest_ticket.id,
             "counter_name": counter['name'],
-            "display_id": earliest_ticket['display_id'],
-            "counter_number": earliest_ticket['counter_number'],
+            "display_id": earliest_ticket.display_id,
+            "counter_number": earliest_ticket.counter_number,
             "mark_served": True,
-            "category": earliest_ticket['category']
-        }, room=earliest_ticket['id'])
+            "category": earliest_ticket.category
+        }, room=earliest_ticket.id)
         
         # Also notify the display to play sound and update
         socketio.emit("ticket_called", {
-            "id": earliest_ticket['id'], 
+            "id": earliest_ticket.id,
             "counter_name": counter['name'], 
             "counter_id": counter_id,
-            "display_id": earliest_ticket['display_id'],
-            "counter_number": earliest_ticket['counter_number']
+            "display_id": earliest_ticket.display_id,
+            "counter_number": earliest_ticket.counter_number
         }, room="display")
-    else:
-        counter['current_ticket'] = None
-    # update display and all counters/admin
-    socketio.emit("display_update", get_display_state(), room="display")
-    socketio.emit("queue_update", get_full_state(), room="all_counters")
+        # the ticket is finished with: its phone leaves the page on ticket_called
+        close_ticket_room(earliest_ticket.id)
+    # update display
+    broadcasts.add_snapshot("display_update", "display", get_display_state)
+
+def close_ticket_room(ticket_id):
+    """Release the Socket.IO room of a called or deleted ticket."""
+    socketio.close_room(ticket_id)
+
+def get_room_stats():
+    """Socket.IO rooms held by this process and the number of sockets in each.
+
+    Every socket's private room (named after its sid) is left out. With
+    several workers each one reports only its own sockets.
+    """
+    rooms = socketio.server.manager.rooms.get("/", {})
+    sizes = {room: len(members) for room, members in rooms.items()
+             if room is not None and room not in members}
+    ticket_rooms = [n for room, n in sizes.items() if room in ticket_registry]
+    return {
+        "connected": len(rooms.get(None, ())),
+        "rooms": len(sizes),
+        "ticket_rooms": len(ticket_rooms),
+        "ticket_room_sockets": sum(ticket_rooms),
+        "max_sockets_per_room": max(sizes.values(), default=0),
+        "sockets_per_room": {room: n for room, n in sizes.items() if room not in ticket_registry},
+    }
+
+def remove_waiting_ticket(ticket_id):
+    """Take a waiting ticket out of its queue; return its category, or None if it is not waiting."""
+    ticket = get_waiting_ticket(ticket_id)
+    if ticket is None:
+        return None
+    commit_delta("ticket_removed", id=ticket_id, category=ticket.category)
+    return ticket.category
+
+def remove_counter(counter_id):
+    if counter_id not in counters:
+        return False
+    commit_delta("counter_changed", counter_id=counter_id, counter=None)
+    return True
+
+def get_persisted_state(state=None):
+    """Everything needed to rebuild the queue after a restart."""
+    state = state or published_state
+    return {
+        "seq": state.seq,
+        "global_arrival_counter": state.global_arrival_counter,
+        "category_counters": state.category_counters,
+        "numbering_day": state.numbering_day,
+        "counter_numbers": state.counter_numbers,
+        "service_times": state.service_times,
+        "counters": state.counters,
+        "queue": {cat: [t.to_wire() for t in waiting] for cat, waiting in state.queue.items()},
+        "counter_queues": {cid: [t.to_wire() for t in served] for cid, served in state.counter_queues.items()}
+    }
+
+def reset_state():
+    """Forget the in-memory state (before reloading it from the backend)."""
+    global state_seq, global_arrival_counter, numbering_day
+    _changed_categories.update(queue)
+    _changed_counters.update(counters, counter_queues, counter_numbers)
+    state_seq = 0
+    global_arrival_counter = 0
+    numbering_day = None
+    for waiting in queue.values():
+        waiting.clear()
+    for cat in category_counters:
+        category_counters[cat] = 0
+    counter_numbers.clear()
+    service_times.clear()
+    counters.clear()
+    counter_queues.clear()
+    ticket_registry.clear()
+    _waiting_views.clear()
+
+def load_snapshot(snapshot):
+    """Set the (freshly reset) in-memory state to a persisted state."""
+    global state_seq, global_arrival_counter, numbering_day
+    state_seq = snapshot['seq']
+    global_arrival_counter = snapshot['global_arrival_counter']
+    category_counters.update(snapshot['category_counters'])
+    numbering_day = snapshot.get('numbering_day')
+    # snapshots from before deleted counters were pruned may still hold theirs
+    counter_numbers.update((cid, numbers) for cid, numbers in snapshot['counter_numbers'].items()
+                           if cid in snapshot['counters'])
+    if 'service_times' in snapshot:
+        service_times.load(snapshot['service_times'])
+    counters.update(snapshot['counters'])
+    _changed_categories.update(queue)
+    _changed_counters.update(counters, snapshot['counter_numbers'], snapshot['counter_queues'])
+    for cid, served in snapshot['counter_queues'].items():
+        if cid not in snapshot['counters']:
+            continue
+        if isinstance(served, dict):
+            # older snapshots kept a history per category: merge them in arrival order
+            served = sorted(chain.from_iterable(served.values()), key=lambda wire: wire['arrival_order'])
+        counter_queues[cid] = deque(map(Ticket.from_wire, served), maxlen=COUNTER_HISTORY)
+        for ticket in counter_queues[cid]:
+            ticket_registry[ticket.id] = {"ticket": ticket, "state": TICKET_CALLED}
+    # after the histories: a waiting ticket wins over an earlier day's ticket of the same id
+    for cat, tickets in snapshot['queue'].items():
+        for wire in tickets:
+            ticket = Ticket.from_wire(wire)
+            queue[cat].append(ticket)
+            ticket_registry[ticket.id] = {"ticket": ticket, "state": TICKET_WAITING}
+
+def load_state():
+    """Load the last snapshot and replay the records after it; return how many were replayed."""
+    global state_seq
+    snapshot, records = state_backend.load()
+    if snapshot:
+        load_snapshot(snapshot)
+    replayed = 0
+    for record in records:
+        if record['seq'] <= state_seq:
+            continue
+        apply_delta(record)
+        state_seq = record['seq']
+        replayed += 1
+    publish_state()
+    return replayed
+
+def restore_state():
+    """Load the persisted state and open the backend for new records."""
+    replayed = load_state()
+    state_backend.open(replayed)
+    if state_seq:
+        app.logger.info(f"Restored queue state at seq {state_seq} ({replayed} records replayed)")
+
+def sync_state():
+    """Apply the records other workers committed since our seq (nothing to do for the memory backend)."""
+    global state_seq
+    records = state_backend.fetch_since(state_seq)
+    if not records:
+        return
+    if records[0]['seq'] != state_seq + 1:
+        # we fell behind the compacted tail: start over from the latest snapshot
+        reset_state()
+        load_state()
+        return
+    for record in records:
+        apply_delta(record)
+        state_seq = record['seq']
+    publish_state()
+    _waiting_views.clear()
+
+# Bring back the queue from disk before serving anything
+restore_state()
+atexit.register(state_backend.close)
 
 # ------------------ ROUTES ------------------
 
+@app.before_request
+def sync_before_request():
+    request.environ["proxima.start"] = time.perf_counter()
+    # pick up what other workers changed before reading any state
+    sync_state()
+
+@app.after_request
+def observe_request(response):
+    start = request.environ.get("proxima.start")
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_request_seconds.get(rule, http_request_seconds["unmatched"]).observe(time.perf_counter() - start)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return "Not authorized", 401
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     error = None
@@ -1888,7 +2262,7 @@ def admin_login():
         else:
             error = "Invalid passcode"
     
-    return render_template_string(admin_login_template, error=error)
+    return render_template(compiled_templates["admin_login"], error=error)
 
 @app.route("/", methods=["GET", "POST"])
 def username_page():
@@ -1896,7 +2270,7 @@ def username_page():
     if request.method == "GET":
         if session.get("user_name"):
             return redirect("/services")
-        return render_template_string(username_template)
+        return render_template(compiled_templates["username"])
 
     # POST -> save name and redirect to services
     first = request.form.get("first_name", "").strip()
@@ -1914,20 +2288,15 @@ def user_home():
     if not session.get("user_name"):
         return redirect("/")
     
-    # Check if user has any active tickets
-    for cat in queue:
-        cat_ticket_key = f"ticket_{cat}"
-        if session.get(cat_ticket_key):
-            ticket_id = session.get(cat_ticket_key)
-            # Verify ticket still exists in queue (not served yet)
-            for t in queue[cat]:
-                if t['id'] == ticket_id:
-                    # User has an active ticket, redirect back to ticket page
-                    flash_message = f"You have an active ticket in {cat}. Please wait for it to be served or delete it first."
-                    session['warning_message'] = flash_message
-                    return redirect(f"/ticket_page/{cat}")
+    # Check if user has any active tickets (still waiting, not served yet)
+    cat, _ = find_active_ticket(session)
+    if cat:
+        # User has an active ticket, redirect back to ticket page
+        flash_message = f"You have an active ticket in {cat}. Please wait for it to be served or delete it first."
+        session['warning_message'] = flash_message
+        return redirect(f"/ticket_page/{cat}")
     
-    return render_template_string(user_template, categories=user_categories)
+    return render_template(compiled_templates["user"], categories=user_categories)
 
 @app.route("/ticket_page/<category>")
 def ticket_page(category):
@@ -1951,60 +2320,33 @@ def ticket_page(category):
         return redirect("/services")
         
     # Check if user already has a ticket for this category in session
-    session_ticket_key = f"ticket_{category}"
-    existing_ticket = session.get(session_ticket_key)
+    existing_ticket = held_ticket(session, category)
     
     # Check if user has any active tickets in any category
-    has_active_ticket = False
-    active_ticket_id = None
-    active_ticket_category = None
-    
-    for cat in queue:
-        cat_ticket_key = f"ticket_{cat}"
-        if session.get(cat_ticket_key):
-            ticket_id = session.get(cat_ticket_key)
-            # Verify ticket still exists in queue
-            for t in queue[cat]:
-                if t['id'] == ticket_id:
-                    has_active_ticket = True
-                    active_ticket_id = ticket_id
-                    active_ticket_category = cat
-                    break
-            if has_active_ticket:
-                break
+    active_ticket_category, active_ticket_id = find_active_ticket(session)
     
     # If user has an active ticket in another category, redirect to deletion page
-    if has_active_ticket and active_ticket_category != category:
+    if active_ticket_category and active_ticket_category != category:
         # Redirect to existing ticket with deletion message
         flash_message = f"You already have an active ticket in {active_ticket_category}. Please delete it before requesting a new ticket."
         session['require_deletion'] = True
         return redirect(f"/view_ticket/{active_ticket_id}")
     
-    # If user already has a ticket for this category, find it in the queue
+    # If user already has a ticket for this category that is still waiting, show it
     if existing_ticket:
-        for t in queue[category]:
-            if t['id'] == existing_ticket:
-                ticket = t
-                break
-        else:
-            # Ticket not found in queue (might have been called or removed)
-            # Generate a new ticket
-            ticket = generate_ticket(category)
-            session[session_ticket_key] = ticket['id']
+        ticket = existing_ticket
     else:
-        # First time requesting a ticket for this category
+        # First ticket for this category, or the last one was called or removed
         ticket = generate_ticket(category)
-        session[session_ticket_key] = ticket['id']
-        
-    # pass ding_url (static) into template so audio uses it
-    ding_url = url_for('static', filename='ding.mp3')
+        hold_ticket(session, ticket)
+
     require_deletion = session.pop('require_deletion', False)
     warning_message = session.pop('warning_message', None)
-    response = make_response(render_template_string(ticket_page_template, 
-                                                  ticket=ticket, 
-                                                  ding_url=ding_url,
-                                                  require_deletion=require_deletion,
-                                                  warning_message=warning_message))
+    response = make_response(render_template(compiled_templates["ticket_page"],
+                                                 ticket=ticket,
+                                                 wait=get_ticket_wait(ticket.id),
+                                                 require_deletion=require_deletion,
+                                                 warning_message=warning_message))
     
     # Add cache control headers to prevent back button navigation
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
@@ -2019,31 +2361,15 @@ def ticket_page(category):
 def delete_ticket(ticket_id):
     """Delete a ticket from the system"""
     try:
-        # Check if ticket exists
-        ticket_found = False
-        category = None
-        
-        # Find and remove ticket from queue
-        for cat in queue:
-            for i, t in enumerate(queue[cat]):
-                if t['id'] == ticket_id:
-                    ticket_found = True
-                    category = cat
-                    # Remove from queue
-                    queue[cat].pop(i)
-                    break
-            if ticket_found:
-                break
-                
-        if not ticket_found:
+        # Remove the ticket from its category queue if it is still waiting
+        category = run_mutation(remove_waiting_ticket, ticket_id)
+        if category is None:
             return jsonify({"success": False, "message": "Ticket not found"}), 404
-            
+        close_ticket_room(ticket_id)
+
         # Remove from session if present
         if 'ticket_id' in session and session['ticket_id'] == ticket_id:
             session.pop('ticket_id', None)
-            
-        # Notify all clients about queue update
-        socketio.emit("queue_update", get_full_state(), room="all_counters")
         
         # Log the deletion for audit purposes (without user data)
         app.logger.info(f"Ticket {ticket_id} deleted from category {category}")
@@ -2070,8 +2396,7 @@ def end_ticket_session():
 
 @app.route("/display")
 def display_page():
-    ding_url = url_for('static', filename='ding.mp3')
-    return render_template_string(display_template, counters=get_display_state(), ding_url=ding_url)
+    return render_template(compiled_templates["display"], counters=get_display_state())
 
 @app.route("/admin")
 def admin_page():
@@ -2080,8 +2405,30 @@ def admin_page():
         return redirect("/admin/login")
         
     # admins can see all categories (including EMGS & PTPTN)
-    names = load_user_names()
-    return render_template_string(admin_template, counters=counters, categories=list(queue.keys()), names=names)
+    # registered names are fetched page by page from /admin/names
+    return render_template(compiled_templates["admin"], counters=published_state.counters,
+                           categories=list(queue.keys()))
+
+@app.route("/admin/names")
+def admin_names():
+    # Check if admin is authenticated
+    if not session.get("admin_authenticated"):
+        return jsonify({"success": False, "message": "Not authorized"}), 401
+
+    try:
+        limit = int(request.args.get("limit", NAMES_PAGE_SIZE))
+    except ValueError:
+        limit = NAMES_PAGE_SIZE
+    names, next_cursor = search_user_names(request.args.get("q", ""), request.args.get("cursor", ""), limit)
+    return jsonify({"names": names, "next_cursor": next_cursor, "total": name_store.count()})
+
+@app.route("/admin/rooms")
+def admin_rooms():
+    # Check if admin is authenticated
+    if not session.get("admin_authenticated"):
+        return jsonify({"success": False, "message": "Not authorized"}), 401
+
+    return jsonify(get_room_stats())
 
 @app.route("/admin/add_counter", methods=["POST"])
 def add_counter():
@@ -2094,10 +2441,10 @@ def add_counter():
     if not name:
         return redirect("/admin")
     counter_id = str(uuid.uuid4())
-    counters[counter_id] = {"name": name, "categories": cats, "current_ticket": None}
+    run_mutation(commit_delta, "counter_changed", counter_id=counter_id,
+                 counter={"name": name, "categories": cats, "current_ticket": None})
     # send updates
-    socketio.emit("display_update", get_display_state(), room="display")
-    socketio.emit("queue_update", get_full_state(), room="all_counters")
+    broadcasts.add_snapshot("display_update", "display", get_display_state)
     return redirect("/admin")
 
 @app.route("/admin/delete_counter/<counter_id>", methods=["POST"])
@@ -2106,10 +2453,8 @@ def delete_counter(counter_id):
     if not session.get("admin_authenticated"):
         return redirect("/admin/login")
         
-    if counter_id in counters:
-        del counters[counter_id]
-        socketio.emit("display_update", get_display_state(), room="display")
-        socketio.emit("queue_update", get_full_state(), room="all_counters")
+    if run_mutation(remove_counter, counter_id):
+        broadcasts.add_snapshot("display_update", "display", get_display_state)
     return ("", 200)
 
 @app.route("/admin/clear_names", methods=["POST"])
@@ -2130,26 +2475,40 @@ def admin_logout():
 def counter_page(counter_id):
     if counter_id not in counters:
         return "Counter not found", 404
-    return render_template_string(counter_template, counter=counters[counter_id], counter_id=counter_id)
+    return render_template(compiled_templates["counter"], counter=counters[counter_id], counter_id=counter_id)
+
+# one latency histogram per route, allocated before the first request
+for rule in app.url_map.iter_rules():
+    http_request_seconds.setdefault(rule.rule, Histogram(LATENCY_BUCKETS))
 
 # ------------------ SOCKET EVENTS ------------------
 
 @socketio.on("join_ticket_room")
 def join_ticket_room(data):
     ticket_id = data.get('ticket_id')
-    if ticket_id:
+    sync_state()
+    # rooms of called/deleted tickets are closed for good, don't reopen them
+    ticket = get_waiting_ticket(ticket_id) if ticket_id else None
+    if ticket is not None:
         join_room(ticket_id)
+        join_room(waiting_room(ticket.category))
+        emit("wait_update", get_ticket_wait(ticket_id), to=request.sid)
 
 @socketio.on("join_display_room")
 def join_display_room():
+    sync_state()
     join_room("display")
     emit("display_update", get_display_state(), to=request.sid)
 
 @socketio.on("join_counter_room")
 def join_counter_room(data):
-    # counters and admin use this 'all_counters' room for live updates
-    join_room("all_counters")
-    emit("queue_update", get_full_state(), to=request.sid)
+    # each counter page only follows its own slice; admin uses 'all_counters'
+    counter_id = data.get('counter_id')
+    if not counter_id:
+        return
+    sync_state()
+    join_room(counter_room(counter_id))
+    emit("counter_view", build_counter_view(counter_id), to=request.sid)
 
 @socketio.on("join_admin")
 def join_admin():
@@ -2157,23 +2516,35 @@ def join_admin():
     if not session.get("admin_authenticated"):
         return
         
+    sync_state()
     join_room("all_counters")
-    emit("queue_update", get_full_state(), to=request.sid)
+    emit("queue_update", get_encoded_state(), to=request.sid)
+
+@socketio.on("request_resync")
+def request_resync():
+    # the admin page missed a queue_delta; send it a fresh snapshot
+    if not session.get("admin_authenticated"):
+        return
+    sync_state()
+    emit("queue_update", get_encoded_state(), to=request.sid)
 
 @socketio.on("call_next")
 def handle_call_next(data):
     try:
         cid = data.get('counter_id')
         if cid:
+            start = time.perf_counter()
             call_next_ticket(cid)
-    except Exception as e:
-        print(f"Error in call_next: {e}")
+            call_next_seconds.observe(time.perf_counter() - start)
+    except Exception:
+        app.logger.exception("Error in call_next")
     
 @socketio.on("call_again")
 def handle_call_again(data):
     try:
         counter_id = data.get('counter_id')
         ticket_id = data.get('ticket_id')
+        sync_state()
         counter = counters.get(counter_id)
         
         if counter and ticket_id and counter.get('current_ticket') == ticket_id:
@@ -0,0 +1,79 @@
+var socket = io(socketOptions);
+
+function deleteCounter(id){
+    if(!confirm("Delete counter?")) return;
+    fetch("/admin/delete_counter/"+id, {method:"POST"})
+    .then(()=>{/* server will emit update */});
+}
+
+// Registered users: pages are fetched from /admin/names as the list scrolls and
+// only the rows in view are rendered.
+var names = {items: [], cursor: null, done: false, loading: false, query: "", rowHeight: 36};
+
+function loadNames(){
+    if(names.loading || names.done) return;
+    names.loading = true;
+    var query = names.query;
+    var url = "/admin/names?q=" + encodeURIComponent(query) + (names.cursor ? "&cursor=" + encodeURIComponent(names.cursor) : "");
+    fetch(url).then(function(r){ return r.json(); }).then(function(page){
+        names.loading = false;
+        if(query !== names.query){ loadNames(); return; }  // search changed while loading
+        names.items = names.items.concat(page.names);
+        names.cursor = page.next_cursor;
+        names.done = !page.next_cursor;
+        document.getElementById('names_total').innerText = "(" + page.total + ")";
+        document.getElementById('names_empty').style.display = (!names.items.length && !query) ? "" : "none";
+        renderNames();
+    }).catch(function(){ names.loading = false; });
+}
+
+function renderNames(){
+    var list = document.getElementById('names_list');
+    var spacer = document.getElementById('names_spacer');
+    var h = names.rowHeight;
+    spacer.style.height = (names.items.length * h) + "px";
+    var first = Math.max(0, Math.floor(list.scrollTop / h) - 10);
+    var last = Math.min(names.items.length, Math.ceil((list.scrollTop + list.clientHeight) / h) + 10);
+    while(list.lastChild !== spacer) list.removeChild(list.lastChild);
+    for(var i = first; i < last; i++){
+        var row = document.createElement('div');
+        row.className = "name-row";
+        row.style.top = (i * h) + "px";
+        row.innerText = names.items[i];
+        list.appendChild(row);
+    }
+    if(last >= names.items.length - 20) loadNames();
+}
+
+document.getElementById('names_list').addEventListener('scroll', renderNames);
+var searchTimer = null;
+document.getElementById('names_search').addEventListener('input', function(e){
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(function(){
+        names.query = e.target.value.trim();
+        names.items = []; names.cursor = null; names.done = false;
+        document.getElementById('names_list').scrollTop = 0;
+        renderNames();
+    }, 200);
+});
+loadNames();
+
+// join admin room and re-render the table whenever the synced state changes
+new QueueState(socket, "join_admin", undefined, function(data){
+    var table = document.getElementById('counter_table');
+    table.innerHTML = "<tr><th>Counter Name</th><th>Services</th><th>Current Ticket</th><th>Counter Link</th><th>Actions</th></tr>";
+    for(var cid in data.counters){
+        var c = data.counters[cid];
+        var row = table.insertRow();
+        row.insertCell(0).innerText = c.name;
+        row.insertCell(1).innerText = c.categories.join(", ");
+        row.insertCell(2).innerText = c.current_ticket || "None";
+        var linkCell = row.insertCell(3);
+        var a = document.createElement('a'); a.href = "/counter/" + cid; a.target="_blank"; a.innerText = "Open Counter";
+        linkCell.appendChild(a);
+        var actions = row.insertCell(4);
+        var btn = document.createElement('button'); btn.innerText = "Delete";
+        btn.onclick = (function(id){ return function(){ deleteCounter(id); }; })(cid);
+        actions.appendChild(btn);
+    }
+});
@@ -0,0 +1,75 @@
+var socket = io(socketOptions);
+var counterId = document.body.dataset.counterId;
+
+// Track the current ticket for Call Again functionality
+var currentTicketId = null;
+
+// (re)join on every connect; rooms do not survive a reconnect
+socket.on("connect", function(){
+    socket.emit("join_counter_room", {counter_id: counterId});
+});
+
+// the server sends only this counter's slice: its record, the head of its
+// waiting line (with the total) and next in line, pre-encoded as JSON bytes
+socket.on("counter_view", function(data){
+    if (data instanceof ArrayBuffer) data = JSON.parse(new TextDecoder().decode(data));
+    var c = data.counter;
+    if(!c){
+        document.getElementById('current_ticket').innerText = "No ticket being served";
+        document.getElementById('next_in_line').innerText = "Next: None";
+        document.getElementById('queue_list').innerHTML = "";
+        document.getElementById('call-again-btn').disabled = true;
+        currentTicketId = null;
+        return;
+    }
+
+    // Update current ticket and Call Again button state
+    if (c.current_ticket) {
+        document.getElementById('current_ticket').innerText = "Serving: " + c.current_ticket;
+        currentTicketId = c.current_ticket;
+        document.getElementById('call-again-btn').disabled = false;
+    } else {
+        document.getElementById('current_ticket').innerText = "No ticket being served";
+        currentTicketId = null;
+        document.getElementById('call-again-btn').disabled = true;
+    }
+
+    // Next in line is computed by the server across all of this counter's categories
+    var waiting = data.waiting;
+    document.getElementById('next_in_line').innerText = "Next: " + (data.next || "None");
+
+    var qlist = document.getElementById('queue_list');
+    qlist.innerHTML = "";
+    for(var k=0; k<waiting.length; k++){
+        var li = document.createElement("li");
+        li.innerText = waiting[k].id + " (" + waiting[k].category + ")";
+        qlist.appendChild(li);
+    }
+    if(data.waiting_count > waiting.length){
+        var more = document.createElement("li");
+        more.innerText = "+ " + (data.waiting_count - waiting.length) + " more waiting";
+        qlist.appendChild(more);
+    }
+});
+
+function callNext(){
+    socket.emit("call_next", {counter_id: counterId});
+}
+
+function callAgain(){
+    if (currentTicketId) {
+        // Add visual feedback
+        var callAgainBtn = document.getElementById('call-again-btn');
+        callAgainBtn.classList.add('active');
+
+        // Remove the active class after animation completes
+        setTimeout(function() {
+            callAgainBtn.classList.remove('active');
+        }, 1000);
+
+        socket.emit("call_again", {
+            counter_id: counterId,
+            ticket_id: currentTicketId
+        });
+    }
+}
@@ -0,0 +1,148 @@
+var socket = io(socketOptions);
+var ding = document.getElementById('ding');
+// Set lower volume for the ding sound
+ding.volume = 0.4; // 40% volume
+
+socket.emit("join_display_room");
+
+socket.on("display_update", function(data){
+    var countersDiv = document.getElementById('counters');
+    countersDiv.innerHTML = '';
+
+    for(var i=0; i < data.length; i++){
+        var counter = data[i];
+        var card = document.createElement('div');
+        card.className = 'counter-card';
+
+        var nameDiv = document.createElement('div');
+        nameDiv.className = 'counter-name';
+        nameDiv.innerText = counter.name;
+
+        var ticketDiv = document.createElement('div');
+        ticketDiv.className = 'ticket-display';
+        ticketDiv.id = 'counter_' + counter.id;
+
+        if(counter.current_ticket){
+            ticketDiv.innerText = counter.current_ticket;
+        } else {
+            var span = document.createElement('span');
+            span.className = 'empty-ticket';
+            span.innerText = '-';
+            ticketDiv.appendChild(span);
+        }
+
+        card.appendChild(nameDiv);
+        card.appendChild(ticketDiv);
+        countersDiv.appendChild(card);
+    }
+});
+
+// Function to announce ticket using speech synthesis
+function announceTicket(ticketId, counterName) {
+    // Format the ticket ID for better pronunciation by spelling out each character
+    let spellOut = '';
+
+    // Spell out each character with spaces between them
+    for (let i = 0; i < ticketId.length; i++) {
+        // Add a space between characters
+        if (i > 0) {
+            spellOut += ' ';
+        }
+
+        // Add the character
+        spellOut += ticketId[i];
+    }
+
+    let announcement = `Ticket ${spellOut}, please proceed to ${counterName}`;
+    console.log("Announcing: " + announcement); // Debug log
+
+    // Check if browser supports speech synthesis
+    if ('speechSynthesis' in window) {
+        // Create a new speech synthesis utterance
+        let utterance = new SpeechSynthesisUtterance(announcement);
+        utterance.rate = 0.8; // Slower rate for clarity when spelling out
+        utterance.pitch = 1;
+        utterance.volume = 1;
+
+        // Get available voices and set to a clear voice if available
+        window.speechSynthesis.getVoices();
+
+        // Wait for the ding sound to complete before speaking
+        setTimeout(() => {
+            console.log("Speaking announcement now");
+            window.speechSynthesis.speak(utterance);
+        }, 1000); // Wait 1 second after the ding starts
+    }
+}
+
+socket.on("ticket_called", function(data){
+    // Always reset and play the ding sound for both Call Next and Call Again
+    try { 
+        // Reset the audio to the beginning
+        ding.pause();
+        ding.currentTime = 0;
+
+        // Play the ding sound first - force it to play every time
+        var playPromise = ding.play();
+
+        // If this is the user's ticket being called, mark it as served in localStorage
+        // and set a cookie to prevent refresh-based ticket creation
+        if (data.mark_served) {
+            localStorage.setItem('ticket_served_' + data.id, 'true');
+
+            // Set a cookie to mark this category as served with proper expiration
+            if (data.category) {
+                // Set cookie with 1 hour expiration and proper path
+                var expirationDate = new Date();
+                expirationDate.setTime(expirationDate.getTime() + (60 * 60 * 1000)); // 1 hour
+                document.cookie = "served_ticket_" + data.category + "=true; expires=" + expirationDate.toUTCString() + "; path=/; SameSite=Lax";
+                console.log("Set served cookie for category:", data.category);
+            }
+
+            // Show a message that the ticket has been served
+            setTimeout(function() {
+                alert("Your ticket has been served. To get a new ticket, please scan the QR code again.");
+            }, 3000); // Show after 3 seconds to allow announcement to complete
+        }
+
+        if (playPromise !== undefined) {
+            playPromise.catch(function(e){
+                console.log("Audio play error:", e);
+                // Try playing again with user interaction
+                document.addEventListener('click', function playOnClick() {
+                    ding.play();
+                    document.removeEventListener('click', playOnClick);
+                }, { once: true });
+            });
+        }
+    } catch(e){
+        console.log("Error playing ding sound:", e);
+    }
+
+    // Announce the ticket vocally AFTER the ding completes
+    // Use the original ticket ID for announcement
+    var ticketToAnnounce = data.id; // Always use the original ticket ID
+    console.log("Ticket called event received. ID:", data.id, "Display ID:", data.display_id);
+    announceTicket(ticketToAnnounce, data.counter_name);
+
+    var counterElem = document.getElementById('counter_' + data.counter_id);
+    if(counterElem){
+        // Display counter-specific number instead of global ID
+        // Use the display_id from the data object
+        counterElem.innerText = data.display_id || data.id;
+        // Flash effect
+        var card = counterElem.parentElement;
+        card.classList.add('flash');
+        setTimeout(function(){
+            card.classList.remove('flash');
+        }, 1000);
+
+        // Highlight the ticket
+        counterElem.style.transition = 'all 0.5s ease';
+        counterElem.style.color = getComputedStyle(document.documentElement).getPropertyValue('--accent').trim();
+        counterElem.style.transform = 'scale(1.1)';
+        setTimeout(function(){
+            counterElem.style.transform = 'scale(1)';
+        }, 1000);
+    }
+});
@@ -0,0 +1,74 @@
+// Used by the admin page: keeps a local copy of the queue state
+// in sync from sequenced queue_delta events, resyncing on any gap.
+function QueueState(socket, joinEvent, joinData, onChange){
+    var self = this;
+    self.seq = null;
+    self.data = null;
+
+    // (re)join on every connect; rooms do not survive a reconnect
+    socket.on("connect", function(){
+        self.seq = null;
+        if (joinData === undefined) {
+            socket.emit(joinEvent);
+        } else {
+            socket.emit(joinEvent, joinData);
+        }
+    });
+
+    socket.on("queue_update", function(data){
+        // the snapshot arrives pre-encoded as JSON bytes
+        if (data instanceof ArrayBuffer) data = JSON.parse(new TextDecoder().decode(data));
+        self.data = data;
+        self.seq = data.seq;
+        onChange(self.data);
+    });
+
+    // deltas arrive in batches, one list per broadcast window
+    socket.on("queue_delta", function(deltas){
+        if (self.seq === null) return;
+        var changed = false;
+        for (var i = 0; i < deltas.length; i++) {
+            var delta = deltas[i];
+            if (delta.seq <= self.seq) continue;
+            if (delta.seq !== self.seq + 1) {
+                // missed an update: drop local state until the snapshot arrives
+                self.seq = null;
+                socket.emit("request_resync");
+                return;
+            }
+            applyQueueDelta(self.data, delta);
+            self.seq = delta.seq;
+            changed = true;
+        }
+        if (changed) onChange(self.data);
+    });
+}
+
+function removeTicket(list, id){
+    for (var i = 0; list && i < list.length; i++) {
+        if (list[i].id === id) { list.splice(i, 1); return; }
+    }
+}
+
+function applyQueueDelta(data, delta){
+    var t = delta.ticket;
+    if (delta.type === "ticket_added") {
+        (data.queue[t.category] = data.queue[t.category] || []).push(t);
+    } else if (delta.type === "ticket_removed") {
+        removeTicket(data.queue[delta.category], delta.id);
+    } else if (delta.type === "ticket_assigned") {
+        removeTicket(data.queue[t.category], t.id);
+        var served = data.counter_queues[t.counter_id] = data.counter_queues[t.counter_id] || [];
+        served.push(t);
+        // the server only keeps the last counter_history tickets per counter, all categories
+        if (served.length > data.counter_history) served.shift();
+        if (data.counters[t.counter_id]) data.counters[t.counter_id].current_ticket = t.id;
+    } else if (delta.type === "counter_changed") {
+        if (delta.counter) {
+            data.counters[delta.counter_id] = delta.counter;
+        } else {
+            delete data.counters[delta.counter_id];
+            delete data.counter_queues[delta.counter_id];
+        }
+    }
+}
@@ -0,0 +1,3 @@
+function selectService(category){
+    location.href = "/ticket_page/" + encodeURIComponent(category);
+}
@@ -0,0 +1,146 @@
+var socket = io(socketOptions);
+var ticketId = document.body.dataset.ticketId;
+var arrivalOrder = Number(document.body.dataset.arrivalOrder);
+// (re)join on every connection: rooms do not survive a reconnect
+socket.on("connect", function(){
+    socket.emit("join_ticket_room", {ticket_id: ticketId});
+});
+
+// place in line and estimated wait: rendered with the page, then pushed on every change
+var waitingEl = document.getElementById('waiting');
+// place as of state seq `seq`, minus the newer removals counted since (applied: removal seq -> true)
+var wait = {position: Number(waitingEl.dataset.position) || 0, seq: Number(waitingEl.dataset.seq) || 0, applied: {}};
+
+function showWait(position, eta) {
+    if (!position) return;
+    var text = "You are #" + position + " in line";
+    if (eta !== null && eta !== undefined && eta !== "") {
+        text += " (about " + Math.max(1, Math.round(eta / 60)) + " min)";
+    }
+    waitingEl.textContent = text;
+}
+
+showWait(wait.position, waitingEl.dataset.eta);
+
+socket.on("wait_update", function(data){
+    if(data && data.id === ticketId && data.seq > wait.seq){
+        // removals newer than this update, already counted, still count
+        var applied = {}, newer = 0;
+        for(var seq in wait.applied){
+            if(Number(seq) > data.seq){ applied[seq] = true; newer += 1; }
+        }
+        wait = {position: data.position - newer, seq: data.seq, applied: applied};
+        showWait(wait.position, data.eta === null ? null : data.eta / data.position * wait.position);
+    }
+});
+
+// many tickets moved at once: count the removals ahead of us that are news to us
+socket.on("queue_shift", function(data){
+    data.removed.forEach(function(removal){
+        if(removal[0] > wait.seq && !wait.applied[removal[0]] && removal[1] < arrivalOrder){
+            wait.applied[removal[0]] = true;
+            wait.position -= 1;
+        }
+    });
+    showWait(wait.position, data.per_place === null ? null : wait.position * data.per_place);
+});
+
+// ticket ding element (served from static/)
+var ticketDing = document.getElementById('ticket-ding');
+ticketDing.preload = "auto";
+
+// Request notification permission
+if ("Notification" in window) {
+    Notification.requestPermission();
+}
+
+function showNotification(title, message) {
+    // Browser notification
+    if ("Notification" in window && Notification.permission === "granted") {
+        new Notification(title, { body: message });
+    }
+
+    // In-page notification
+    var notificationEl = document.getElementById('notification');
+    notificationEl.textContent = message;
+    notificationEl.style.display = 'block';
+
+    setTimeout(function() {
+        notificationEl.style.display = 'none';
+    }, 10000);
+}
+
+
+
+socket.on("ticket_called", function(data){
+    if(data.id === ticketId){
+        try { 
+            ticketDing.currentTime = 0; 
+            ticketDing.play().catch(function(e) {
+                console.log("Audio play error:", e);
+            }); 
+        } catch(e){}
+
+        // Update UI
+        document.getElementById('counter_info').innerHTML = "Assigned Counter: <strong>" + data.counter_name + "</strong>";
+        var ticketNumber = document.getElementById('ticket_number');
+        ticketNumber.classList.remove('pulse');
+        ticketNumber.classList.add('called');
+
+        // Show notification
+        showNotification(
+            "Your ticket is ready!", 
+            "Ticket " + ticketId + " is now being served at " + data.counter_name
+        );
+
+        // Mark ticket as served - allow navigation
+        ticketServed = true;
+
+        // Terminate session and force restart flow (cross-browser safe)
+        try { localStorage.setItem('ticket_terminated', '1'); } catch(e) {}
+        fetch('/end_ticket_session', { method: 'POST' })
+            .then(function(){ location.replace('/'); })
+            .catch(function(){ location.replace('/'); });
+
+        // Vibrate if supported
+        if ("vibrate" in navigator) {
+            navigator.vibrate([200, 100, 200]);
+        }
+    }
+});
+
+// Delete ticket functionality
+document.getElementById('delete-ticket').addEventListener('click', function() {
+    var modal = document.getElementById('delete-modal');
+    modal.style.display = 'flex';
+});
+
+document.getElementById('cancel-delete').addEventListener('click', function() {
+    var modal = document.getElementById('delete-modal');
+    modal.style.display = 'none';
+});
+
+document.getElementById('confirm-delete').addEventListener('click', function() {
+    // Send delete request to server
+    fetch('/delete_ticket/' + ticketId, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showNotification("Ticket Deleted", "Your ticket has been successfully deleted");
+            // Mark ticket as deleted - allow navigation
+            ticketServed = true;
+            // Redirect to home page after a short delay
+            setTimeout(function() {
+                window.location.href = '/';
+            }, 2000);
+        } else {
+            showNotification("Error", data.message || "Failed to delete ticket");
+        }
+    })
+    .catch(error => {
+        showNotification("Error", "An error occurred while deleting the ticket");
+        console.error('Error:', error);
+    });
+});
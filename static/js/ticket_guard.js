@@ -0,0 +1,42 @@
+var ticketServed = false;
+
+// If a previous ticket session was terminated, redirect to home
+try {
+  if (localStorage.getItem("ticket_terminated") === "1") {
+    localStorage.removeItem("ticket_terminated");
+    location.replace("/");
+  }
+} catch(e) {}
+
+// Prevent back button navigation
+history.pushState(null, null, document.URL);
+window.addEventListener('popstate', function (event) {
+  if (!ticketServed) {
+    // Show warning and prevent navigation
+    alert("Your ticket has not been served yet. Please wait for your ticket to be called or delete it if you want to leave.");
+    history.pushState(null, null, document.URL);
+  }
+});
+
+// Prevent page refresh with warning
+window.addEventListener('beforeunload', function (event) {
+  if (!ticketServed) {
+    event.preventDefault();
+    event.returnValue = 'Your ticket has not been served yet. Are you sure you want to leave?';
+    return 'Your ticket has not been served yet. Are you sure you want to leave?';
+  }
+});
+
+// Safari/iOS: BFCache handling — reload on back/forward to re-run server checks
+window.addEventListener('pageshow', function (event) {
+  var navEntries = (performance && performance.getEntriesByType) ? performance.getEntriesByType('navigation') : null;
+  var isBackForward = navEntries && navEntries[0] && navEntries[0].type === 'back_forward';
+  if ((event.persisted || isBackForward) && !ticketServed) {
+    // Force a full reload so server-side session checks/redirects apply
+    window.location.reload();
+  }
+});
+
+// Register an unload handler to discourage Safari from putting this page in BFCache
+// (empty handler is enough to disqualify some versions of Safari)
+window.addEventListener('unload', function(){});
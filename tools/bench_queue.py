@@ -0,0 +1,203 @@
+"""Microbenchmarks of the queue engine, with JSON baselines to catch regressions.
+
+Times generate_ticket, call_next_ticket, delete_ticket (the route, in a
+request context), get_full_state, encode_full_state, get_display_state and
+one broadcast flush for every combination of --sizes waiting tickets and
+--counters counters (each serving two categories). Operations are timed
+one at a time, and the queue is topped up or trimmed between them (not
+timed) so it stays at the given size. Broadcasts are coalesced as in
+production: mutations only queue them, and the "broadcast flush" row is the
+cost of sending what one mutation queued, once per BROADCAST_WINDOW_MS.
+
+    python tools/bench_queue.py --save baseline.json
+    python tools/bench_queue.py --compare baseline.json --threshold 0.2
+
+--compare exits with status 1 if any median got slower than the baseline
+by more than --threshold (a fraction); run both on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    os.environ["PROXIMA_DATA_DIR"] = tempfile.mkdtemp(prefix="proxima-bench-")
+    os.environ["BROADCAST_WINDOW_MS"] = "100"
+    os.environ["JOURNAL_SYNC_MS"] = "60000"
+    os.environ["SNAPSHOT_EVERY"] = str(10 ** 9)
+    sys.path.insert(0, ROOT)
+    import Proxima
+    return Proxima
+
+
+def setup(proxima, tickets, counters):
+    """Fresh state with `tickets` waiting (spread over all categories) and `counters` counters."""
+    proxima.reset_state()
+    categories = list(proxima.queue)
+    for i in range(counters):
+        proxima.commit_delta("counter_changed", counter_id=f"bench-{i}", counter={
+            "name": f"Counter {i + 1}", "current_ticket": None,
+            "categories": [categories[i % len(categories)], categories[(i + 1) % len(categories)]]})
+    waiting = [proxima.generate_ticket(categories[i % len(categories)]).id for i in range(tickets)]
+    proxima.state_backend.sync()
+    proxima.broadcasts.flush()
+    return waiting
+
+
+def measure(op, ops, budget):
+    """Run op() up to `ops` times (fewer once `budget` seconds are spent); return per-call seconds."""
+    samples = []
+    spent = 0.0
+    for _ in range(ops):
+        elapsed = op()
+        samples.append(elapsed)
+        spent += elapsed
+        if spent > budget and len(samples) >= 5:
+            break
+    return samples
+
+
+def bench(proxima, tickets, counters, args):
+    """Return {operation: per-call seconds} for one queue size and counter count."""
+    rng = random.Random(args.seed)
+    categories = list(proxima.queue)
+    waiting = setup(proxima, tickets, counters)
+    counter_ids = [f"bench-{i}" for i in range(counters)]
+    turn = [0]
+
+    def next_category():
+        turn[0] += 1
+        return categories[turn[0] % len(categories)]
+
+    def generate():
+        start = time.perf_counter()
+        ticket = proxima.generate_ticket(next_category())
+        elapsed = time.perf_counter() - start
+        proxima.run_mutation(proxima.remove_waiting_ticket, ticket.id)
+        return elapsed
+
+    def call_next():
+        counter_id = counter_ids[turn[0] % counters]
+        turn[0] += 1
+        waiting.append(proxima.generate_ticket(proxima.counters[counter_id]['categories'][0]).id)
+        start = time.perf_counter()
+        proxima.call_next_ticket(counter_id)
+        return time.perf_counter() - start
+
+    def delete():
+        waiting.append(proxima.generate_ticket(next_category()).id)
+        ticket_id = None
+        while ticket_id is None or proxima.get_waiting_ticket(ticket_id) is None:
+            i = rng.randrange(len(waiting))  # skip tickets call_next took meanwhile
+            waiting[i], waiting[-1] = waiting[-1], waiting[i]
+            ticket_id = waiting.pop()
+        with proxima.app.test_request_context(f"/delete_ticket/{ticket_id}", method="POST"):
+            start = time.perf_counter()
+            proxima.delete_ticket(ticket_id)
+            return time.perf_counter() - start
+
+    def timed(fn):
+        def run():
+            start = time.perf_counter()
+            fn()
+            return time.perf_counter() - start
+        return run
+
+    def flush():
+        proxima.broadcasts.flush()
+        ticket = proxima.generate_ticket(next_category())
+        start = time.perf_counter()
+        proxima.broadcasts.flush()
+        elapsed = time.perf_counter() - start
+        proxima.run_mutation(proxima.remove_waiting_ticket, ticket.id)
+        return elapsed
+
+    operations = {
+        "generate_ticket": generate,
+        "call_next_ticket": call_next if counters else None,
+        "delete_ticket": delete,
+        "get_full_state": timed(proxima.get_full_state),
+        "encode_full_state": timed(proxima.encode_full_state),
+        "get_display_state": timed(proxima.get_display_state),
+        "broadcast flush": flush,
+    }
+    results = {}
+    for name, op in operations.items():
+        if op is not None:
+            results[name] = measure(op, args.ops, args.budget)
+            proxima.broadcasts.flush()  # drop what the untimed part queued
+    assert sum(map(len, proxima.queue.values())) == tickets
+    proxima.state_backend.sync()
+    return results
+
+
+def run_all(args):
+    proxima = load_app()
+    results = {}
+    for tickets in args.sizes:
+        for counters in args.counters:
+            for name, samples in bench(proxima, tickets, counters, args).items():
+                samples.sort()
+                results[f"{name} tickets={tickets} counters={counters}"] = {
+                    "median_us": statistics.median(samples) * 1e6,
+                    "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+                    "runs": len(samples),
+                }
+    return {"python": platform.python_version(), "machine": platform.machine(), "ops": args.ops,
+            "results": results}
+
+
+def report(current, baseline, threshold):
+    """Print every result (against the baseline if given); return the regressed keys."""
+    regressions = []
+    header = f"{'':56s} {'median us':>11s} {'p99 us':>11s}"
+    print(header + (f" {'baseline':>11s} {'change':>8s}" if baseline else ""))
+    for key, result in current["results"].items():
+        line = f"{key:56s} {result['median_us']:11.1f} {result['p99_us']:11.1f}"
+        old = baseline["results"].get(key) if baseline else None
+        if old:
+            change = result['median_us'] / old['median_us'] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            line += f" {old['median_us']:11.1f} {change:+8.0%}{flag}"
+            if flag:
+                regressions.append(key)
+        print(line)
+    return regressions
+
+
+def main(args):
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    current = run_all(args)
+    regressions = report(current, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=1)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=lambda s: [int(n) for n in s.split(",")], default=[10, 1000, 10000, 100000],
+                        help="waiting tickets, comma separated")
+    parser.add_argument("--counters", type=lambda s: [int(n) for n in s.split(",")], default=[1, 10, 50],
+                        help="counter counts, comma separated")
+    parser.add_argument("--ops", type=int, default=200, help="calls timed per operation")
+    parser.add_argument("--budget", type=float, default=2.0, help="stop timing an operation after this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, as a fraction")
+    main(parser.parse_args())
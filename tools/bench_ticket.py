@@ -0,0 +1,85 @@
+"""Microbenchmark: memory and snapshot cost of Ticket records vs the old plain-dict tickets.
+
+Builds N waiting tickets both ways (the dict layout add_ticket used to
+create, and Proxima.Ticket) and reports memory per ticket, the time to
+call a ticket, and the time to snapshot all of them to JSON: the old
+copy-then-json.dumps path against the Ticket.to_json path that
+get_encoded_state() uses now (immutable records need no copy).
+
+    python tools/bench_ticket.py --tickets 10000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    os.environ.setdefault("PROXIMA_DATA_DIR", tempfile.mkdtemp(prefix="proxima-bench-"))
+    sys.path.insert(0, ROOT)
+    import Proxima
+    return Proxima
+
+
+def make_dicts(ids, categories):
+    return [{"id": tid, "category": categories[i % len(categories)], "arrival_order": i + 1,
+             "counter_id": None, "counter_number": None} for i, tid in enumerate(ids)]
+
+
+def make_records(proxima, ids, categories):
+    return [proxima.Ticket.new(tid, categories[i % len(categories)], i + 1) for i, tid in enumerate(ids)]
+
+
+def assign_dict(ticket):
+    called = ticket.copy()
+    called['counter_id'] = "counter-1"
+    called['counter_number'] = 1
+    called['display_id'] = called['id']
+    return called
+
+
+def bytes_per_ticket(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tickets = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(tickets), tickets
+
+
+def best(stmt, repeat=5, number=1):
+    return min(timeit.repeat(stmt, repeat=repeat, number=number)) / number
+
+
+def main(args):
+    proxima = load_app()
+    categories = list(proxima.queue)
+    prefixes = [proxima.ticket_prefixes[cat] for cat in categories]
+    ids = [f"{prefixes[i % len(prefixes)]}-{i + 1:03d}" for i in range(args.tickets)]
+
+    dict_bytes, dicts = bytes_per_ticket(lambda: make_dicts(ids, categories))
+    record_bytes, records = bytes_per_ticket(lambda: make_records(proxima, ids, categories))
+
+    rows = [
+        ("memory per ticket (bytes)", dict_bytes, record_bytes, 1),
+        ("call one ticket (us)",
+         best(lambda: [assign_dict(t) for t in dicts]) / len(dicts),
+         best(lambda: [t.assign("counter-1", 1) for t in records]) / len(records), 1e6),
+        (f"snapshot {args.tickets} to JSON (ms)",
+         best(lambda: json.dumps({"waiting": [t.copy() for t in dicts]}, separators=(",", ":"))),
+         best(lambda: proxima.encode_ticket_lists({"waiting": records})), 1e3),
+    ]
+    print(f"{'':34s} {'dict':>10s} {'Ticket':>10s}")
+    for name, old, new, scale in rows:
+        print(f"{name:34s} {old * scale:10.2f} {new * scale:10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=10000)
+    main(parser.parse_args())
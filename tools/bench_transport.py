@@ -0,0 +1,112 @@
+"""Benchmark: Socket.IO connection setup cost per client for each transport mode.
+
+Starts the app on a local port once per SOCKETIO_TRANSPORTS setting and
+connects clients to it, timing each one from connect() until it has joined
+the display room on its final transport, and counting the HTTP requests it
+needed on the way (the websocket handshake counts as one). Clients connect
+in waves of --concurrency at a time.
+
+The Python client upgrades to websocket right after the polling handshake;
+browsers also exchange the namespace connect and a poll over HTTP first, so
+the saving from websocket-first is larger for real phones than shown here.
+
+Needs the Socket.IO test client: pip install "python-socketio[client]"
+
+    python tools/bench_transport.py --clients 200 --concurrency 20
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ["polling,websocket", "websocket,polling", "websocket"]
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    import Proxima
+    Proxima.socketio.run(Proxima.app, host="127.0.0.1", port=port, log_output=False)
+
+
+def start_server(mode, port):
+    env = dict(os.environ, PYTHONWARNINGS="ignore", SOCKETIO_TRANSPORTS=mode,
+               PROXIMA_DATA_DIR=tempfile.mkdtemp(prefix="proxima-bench-"))
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                            env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit(f"server for {mode} did not start")
+
+
+def connect_once(url, transports):
+    """Return (seconds until joined on the final transport, HTTP requests used)."""
+    import requests
+    import socketio
+
+    http = requests.Session()
+    requests_made = [0]
+    http.hooks["response"].append(lambda r, *a, **kw: requests_made.__setitem__(0, requests_made[0] + 1))
+    client = socketio.Client(http_session=http, reconnection=False)
+    joined = threading.Event()
+    client.on("display_update", lambda data: joined.set())
+
+    start = time.perf_counter()
+    client.connect(url, transports=transports)
+    client.emit("join_display_room")
+    joined.wait(10)
+    while "websocket" in transports and client.transport() != "websocket":
+        time.sleep(0.001)  # wait for the polling -> websocket upgrade to finish
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+    return elapsed, requests_made[0] + (1 if "websocket" in transports else 0)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(args):
+    for i, mode in enumerate(MODES):
+        port = args.port + i
+        proc = start_server(mode, port)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            transports = mode.split(",")
+            connect_once(url, transports)  # warm up
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                results = list(pool.map(lambda _: connect_once(url, transports), range(args.clients)))
+        finally:
+            proc.terminate()
+            proc.wait()
+        times = [t * 1000 for t, _ in results]
+        print(f"{mode:18s} clients={args.clients} concurrency={args.concurrency}  "
+              f"mean={statistics.mean(times):6.1f}ms p50={percentile(times, 50):6.1f}ms "
+              f"p95={percentile(times, 95):6.1f}ms  http requests/client="
+              f"{statistics.mean(n for _, n in results):.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5400)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        main(args)
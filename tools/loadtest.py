@@ -0,0 +1,315 @@
+"""Load test: a compressed service day of students, counters and displays against a local server.
+
+Starts the app on a local port (one eventlet worker with a fresh data
+directory, as in production) unless --url points at a running one, then:
+
+- --students phones arrive evenly over --duration seconds. Each goes
+  / -> POST / (name) -> /services -> /ticket_page/<category>, connects a
+  Socket.IO client and waits in its ticket room until the ticket is called;
+- --counters counters, created through the admin page, emit call_next every
+  --call-interval seconds (call_again instead for a --call-again fraction);
+- --displays display pages sit in the display room.
+
+Reports p50/p95/p99 latency per HTTP route, for connecting a socket, and
+from call_next to ticket_called as received by the student and by the
+displays, plus the server's peak RSS. Students whose ticket the displays
+announced but whose phone never got ticket_called (it was called before
+the phone joined its room) count as missed. Categories, call_again
+choices and arrival times depend only on --seed, so runs are repeatable.
+
+Every client is a thread of this process, so on one machine they compete
+with the server for CPU; point --url at a server on another host when the
+absolute numbers matter.
+
+Needs the Socket.IO test client: pip install "python-socketio[client]"
+
+    python tools/loadtest.py --students 300 --counters 6 --displays 3 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = ["Passport Submission", "Passport Collection", "I-Kad Collection", "Medical Insurance Inquiry"]
+ADMIN_PASSCODE = "apuvisa2025"
+STUDENT_CALLED = "call_next -> ticket_called (student)"
+DISPLAY_CALLED = "call_next -> ticket_called (display)"
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    import Proxima
+    Proxima.socketio.run(Proxima.app, host="127.0.0.1", port=port, log_output=False)
+
+
+def start_server(port, transports):
+    env = dict(os.environ, PYTHONWARNINGS="ignore", SOCKETIO_TRANSPORTS=transports,
+               PROXIMA_DATA_DIR=tempfile.mkdtemp(prefix="proxima-load-"))
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                            env=env, stdout=subprocess.DEVNULL, cwd=env["PROXIMA_DATA_DIR"])
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("server did not start")
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MB (Linux only), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Stats:
+    """Latency samples per operation, plus error messages."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = []
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds * 1000)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def create_counters(url, count):
+    """Log in as admin, add `count` counters serving every student category; return [(name, id)]."""
+    import requests
+
+    admin = requests.Session()
+    admin.post(f"{url}/admin/login", data={"passcode": ADMIN_PASSCODE}, timeout=30)
+    for i in range(count):
+        admin.post(f"{url}/admin/add_counter", data={"name": f"Load counter {i + 1}", "categories": CATEGORIES},
+                   timeout=30)
+    page = admin.get(f"{url}/admin", timeout=30).text
+    rows = re.findall(r'<tr id="row_([^"]+)">\s*<td>([^<]*)</td>', page)
+    return [(name, cid) for cid, name in rows if name.startswith("Load counter")]
+
+
+def student(url, n, category, transports, stats, call_sent, announced, stop):
+    """One phone: walk to a ticket, join its room and wait until it is called.
+
+    Returns "served", or "missed" if the displays announced the ticket but
+    the phone never heard of it.
+    """
+    import requests
+    import socketio
+
+    http = requests.Session()
+
+    def timed(name, method, path, **kwargs):
+        start = time.perf_counter()
+        response = http.request(method, url + path, allow_redirects=False, timeout=30, **kwargs)
+        stats.add(name, time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        return response
+
+    timed("GET /", "GET", "/")
+    timed("POST /", "POST", "/", data={"first_name": f"Student{n}", "last_name": "Load"})
+    timed("GET /services", "GET", "/services")
+    page = timed("GET /ticket_page/<category>", "GET", f"/ticket_page/{quote(category)}")
+    ticket_id = re.search(r'data-ticket-id="([^"]+)"', page.text).group(1)
+
+    client = socketio.Client(http_session=http, reconnection=False)
+    called = threading.Event()
+
+    @client.on("ticket_called")
+    def on_called(data):
+        sent = call_sent.get(data.get("counter_name"))
+        if data.get("mark_served") and sent:
+            stats.add(STUDENT_CALLED, time.perf_counter() - sent)
+            called.set()
+
+    start = time.perf_counter()
+    client.connect(url, transports=transports)
+    stats.add("socket connect", time.perf_counter() - start)
+    client.emit("join_ticket_room", {"ticket_id": ticket_id})
+    while not called.is_set() and not stop.is_set():
+        called.wait(0.2)
+        if time.perf_counter() - announced.get(ticket_id, float("inf")) > 2:
+            break
+    client.disconnect()
+    if called.is_set():
+        return "served"
+    return "missed" if ticket_id in announced else None
+
+
+def decode_in_order(client):
+    """Make a Socket.IO client decode Engine.IO messages one by one, in arrival order.
+
+    python-socketio hands each message to a new thread, so a binary event
+    (counter_view) and its attachment can be decoded out of order; a browser
+    never does that.
+    """
+    trigger = client.eio._trigger_event
+
+    def trigger_in_order(event, *args, **kwargs):
+        if event == "message":
+            kwargs["run_async"] = False
+        return trigger(event, *args, **kwargs)
+
+    client.eio._trigger_event = trigger_in_order
+
+
+def counter(url, name, counter_id, transports, interval, call_again, seed, call_sent, stop):
+    """One counter page calling tickets until the run stops."""
+    import socketio
+
+    rng = random.Random(seed)
+    current = {"ticket": None}
+    client = socketio.Client(reconnection=False)
+    decode_in_order(client)
+
+    @client.on("counter_view")
+    def on_view(view):
+        view = json.loads(view)  # sent as JSON bytes
+        current.update(ticket=(view.get("counter") or {}).get("current_ticket"))
+
+    client.connect(url, transports=transports)
+    client.emit("join_counter_room", {"counter_id": counter_id})
+    while not stop.wait(interval):
+        if current["ticket"] and rng.random() < call_again:
+            client.emit("call_again", {"counter_id": counter_id, "ticket_id": current["ticket"]})
+        else:
+            call_sent[name] = time.perf_counter()
+            client.emit("call_next", {"counter_id": counter_id})
+    client.disconnect()
+
+
+def display(url, transports, stats, call_sent, announced, stop):
+    """One display page timing the ticket_called announcements of call_next."""
+    import socketio
+
+    client = socketio.Client(reconnection=False)
+
+    @client.on("ticket_called")
+    def on_called(data):
+        announced.setdefault(data.get("id"), time.perf_counter())
+        sent = call_sent.get(data.get("counter_name"))
+        if "counter_number" in data and sent:  # call_again announcements carry no number
+            stats.add(DISPLAY_CALLED, time.perf_counter() - sent)
+
+    client.on("display_update", lambda data: None)
+    client.connect(url, transports=transports)
+    client.emit("join_display_room")
+    stop.wait()
+    client.disconnect()
+
+
+def run(args, url):
+    transports = args.transports.split(",")
+    rng = random.Random(args.seed)
+    stats = Stats()
+    call_sent = {}  # counter name -> perf_counter() of its last call_next
+    announced = {}  # ticket id -> perf_counter() when a display first heard it called
+    stop = threading.Event()
+    outcomes = []   # "served" / "missed" per finished student
+
+    def background(target, *target_args):
+        def guarded():
+            try:
+                outcome = target(*target_args)
+                if outcome:
+                    outcomes.append(outcome)
+            except Exception as e:
+                stats.errors.append(f"{target.__name__}: {e!r}")
+        thread = threading.Thread(target=guarded, daemon=True)
+        thread.start()
+        return thread
+
+    counters = create_counters(url, args.counters)
+    others = [background(counter, url, name, cid, transports, args.call_interval, args.call_again,
+                         args.seed + i, call_sent, stop) for i, (name, cid) in enumerate(counters)]
+    others += [background(display, url, transports, stats, call_sent, announced, stop)
+               for _ in range(args.displays)]
+
+    start = time.perf_counter()
+    students = []
+    for n in range(args.students):
+        arrival = start + n * args.duration / max(args.students, 1)
+        time.sleep(max(0.0, arrival - time.perf_counter()))
+        students.append(background(student, url, n, rng.choice(CATEGORIES), transports, stats, call_sent,
+                                   announced, stop))
+
+    deadline = time.perf_counter() + args.drain
+    while len(outcomes) + len(stats.errors) < args.students and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in students + others:
+        thread.join(10)
+    return stats, outcomes.count("served"), outcomes.count("missed"), elapsed
+
+
+def main(args):
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))  # every phone holds a socket
+    proc = None
+    url = args.url
+    if url is None:
+        proc = start_server(args.port, args.transports)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        stats, served, missed, elapsed = run(args, url)
+        rss = peak_rss_mb(proc.pid) if proc else None
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{args.students} students, {args.counters} counters, {args.displays} displays, "
+          f"transports={args.transports}: {served} served, {missed} missed in {elapsed:.1f}s, "
+          f"{len(stats.errors)} errors")
+    print(f"{'':38s} {'n':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  (ms)")
+    for name, values in stats.samples.items():
+        print(f"{name:38s} {len(values):6d} {percentile(values, 50):8.1f} {percentile(values, 95):8.1f} "
+              f"{percentile(values, 99):8.1f}")
+    print(f"server peak RSS: {f'{rss:.1f} MB' if rss is not None else 'n/a'}")
+    for error in stats.errors[:10]:
+        print("error:", error)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--counters", type=int, default=5)
+    parser.add_argument("--displays", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30, help="seconds over which students arrive")
+    parser.add_argument("--drain", type=float, default=120, help="seconds to wait for the last calls after that")
+    parser.add_argument("--call-interval", type=float, default=0.5, help="seconds between calls of one counter")
+    parser.add_argument("--call-again", type=float, default=0.1, help="fraction of calls that are call_again")
+    parser.add_argument("--transports", default="polling,websocket")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="test a running server instead of starting one (no RSS then)")
+    parser.add_argument("--port", type=int, default=5500)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        main(args)
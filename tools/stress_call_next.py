@@ -0,0 +1,213 @@
+"""Stress check: counters calling the next ticket at the same time must never share a ticket.
+
+Issues N tickets, then lets P processes x G green threads (one counter each)
+claim tickets as fast as they can until the queue is empty, and checks that
+every ticket was assigned exactly once. With more than one process the
+workers share a SQLite state backend in a temporary directory; with one
+process the default in-memory backend is used, in two rounds: with the
+journal's batched fsync and with JOURNAL_SYNC_MS=0, where every commit
+fsyncs (and yields to the other green threads) before returning, with a
+snapshot every --snapshot-every records. The in-memory run then checks the
+waiting phones: tickets with a socket each while counters claim and tickets
+get deleted, with QUEUE_SHIFT_MIN=0 (every move is a queue_shift) and the
+default; each phone follows wait_update/queue_shift like static/js/ticket.js,
+with every queue_shift delivered twice, and must end on its TicketLine rank.
+Exits with status 1 if any ticket was claimed twice, missed, a green thread
+failed, or a phone shows the wrong place.
+
+    python tools/stress_call_next.py --tickets 2000 --processes 4 --greenlets 25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = ["Passport Submission", "Passport Collection", "I-Kad Collection", "PTPTN"]
+
+
+def load_app(data_dir, backend):
+    os.environ["PROXIMA_DATA_DIR"] = data_dir
+    os.environ["PROXIMA_STATE_BACKEND"] = backend
+    os.environ["BROADCAST_WINDOW_MS"] = "0"
+    sys.path.insert(0, ROOT)
+    import Proxima
+    return Proxima
+
+
+def claim_all(proxima, counter_ids, errors=None, limit=None):
+    """Run one green thread per counter until nothing (or `limit` claims) is left; return the claimed ticket ids."""
+    import eventlet
+    claimed = []
+
+    def serve(counter_id):
+        try:
+            while limit is None or len(claimed) < limit:
+                ticket = proxima.run_mutation(proxima.claim_next_ticket, counter_id)
+                if ticket is None:
+                    return
+                claimed.append(ticket.id)
+                eventlet.sleep(0)  # let the other counters in
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(f"{counter_id}: {e!r}")
+
+    pool = eventlet.GreenPool(len(counter_ids))
+    for counter_id in counter_ids:
+        pool.spawn(serve, counter_id)
+    pool.waitall()
+    return claimed
+
+
+def worker(args):
+    proxima = load_app(args.data_dir, "sqlite")
+    print(json.dumps(claim_all(proxima, args.counters.split(","))))
+
+
+def run_round(proxima, args, counter_ids, data_dir, label):
+    """Issue --tickets tickets, have every counter claim them; return True if each was claimed once."""
+    issued = [proxima.generate_ticket(CATEGORIES[i % len(CATEGORIES)]).id for i in range(args.tickets)]
+    errors = []
+    if args.processes == 1:
+        claimed = claim_all(proxima, counter_ids, errors)
+    else:
+        env = dict(os.environ, PYTHONWARNINGS="ignore")
+        workers = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", "--data-dir", data_dir,
+                              "--counters", ",".join(counter_ids[p::args.processes])],
+                             stdout=subprocess.PIPE, env=env)
+            for p in range(args.processes)
+        ]
+        claimed = []
+        for proc in workers:
+            out, _ = proc.communicate()
+            if proc.returncode != 0:
+                sys.exit(f"worker exited with {proc.returncode}")
+            claimed.extend(json.loads(out.decode().strip().splitlines()[-1]))
+        proxima.sync_state()
+
+    counts = Counter(claimed)
+    duplicates = sorted(tid for tid, n in counts.items() if n > 1)
+    missing = sorted(set(issued) - set(counts))
+    still_waiting = sum(len(waiting) for waiting in proxima.queue.values())
+    print(f"{args.tickets} tickets, {len(counter_ids)} counters ({args.processes} process(es) x "
+          f"{args.greenlets} green threads, {label}): {len(claimed)} claims, "
+          f"{len(duplicates)} duplicated, {len(missing)} missing, {still_waiting} left waiting, "
+          f"{len(errors)} errors")
+    if duplicates or missing or still_waiting or errors:
+        print("duplicated:", duplicates[:10], "missing:", missing[:10], "errors:", errors[:3])
+        return False
+    return True
+
+
+class Phone:
+    """A ticket page: its place in line, kept up the way static/js/ticket.js does."""
+
+    def __init__(self, proxima, ticket):
+        self.ticket = ticket
+        self.client = proxima.socketio.test_client(proxima.app)
+        self.position, self.seq, self.applied = 0, 0, set()
+        self.client.emit("join_ticket_room", {"ticket_id": ticket.id})
+
+    def receive(self):
+        for event in self.client.get_received():
+            data = event["args"][0] if event["args"] else None
+            if event["name"] == "wait_update" and data and data["id"] == self.ticket.id and data["seq"] > self.seq:
+                self.applied = {seq for seq in self.applied if seq > data["seq"]}
+                self.position, self.seq = data["position"] - len(self.applied), data["seq"]
+            elif event["name"] == "queue_shift":
+                for _ in range(2):  # a removal heard twice must count once
+                    for seq, order in data["removed"]:
+                        if seq > self.seq and seq not in self.applied and order < self.ticket.arrival_order:
+                            self.applied.add(seq)
+                            self.position -= 1
+
+
+def phone_round(proxima, args, counter_ids, shift_min):
+    """Claim and delete tickets under watching phones; return True if every phone ends on its rank."""
+    import eventlet
+    proxima.QUEUE_SHIFT_MIN = shift_min
+    phones = [Phone(proxima, proxima.generate_ticket(CATEGORIES[i % len(CATEGORIES)])) for i in range(args.phones)]
+    errors = []
+
+    def delete_some():
+        for phone in phones[1::7]:
+            proxima.run_mutation(proxima.remove_waiting_ticket, phone.ticket.id)
+            eventlet.sleep(0)
+
+    deleter = eventlet.spawn(delete_some)
+    claimed = claim_all(proxima, counter_ids, errors, limit=args.phones // 2)
+    deleter.wait()
+    proxima.broadcasts.flush()
+    wrong = []
+    for phone in phones:
+        phone.receive()
+        waiting = proxima.published_state.queue[phone.ticket.category]
+        if proxima.get_waiting_ticket(phone.ticket.id) is not None:
+            rank = waiting.rank(phone.ticket.arrival_order) + 1
+            if phone.position != rank:
+                wrong.append((phone.ticket.id, phone.position, rank))
+        phone.client.disconnect()
+    print(f"{args.phones} phones, QUEUE_SHIFT_MIN={shift_min}: {len(claimed)} claims, "
+          f"{len(wrong)} wrong places, {len(errors)} errors")
+    # leave the queue empty for the next round
+    while claim_all(proxima, counter_ids[:1], errors):
+        pass
+    if wrong or errors:
+        print("wrong (id, shown, rank):", wrong[:10], "errors:", errors[:3])
+        return False
+    return True
+
+
+def main(args):
+    data_dir = tempfile.mkdtemp(prefix="proxima-stress-")
+    backend = "sqlite" if args.processes > 1 else "memory"
+    proxima = load_app(data_dir, backend)
+
+    counter_ids = []
+    for i in range(args.processes * args.greenlets):
+        counter_id = f"stress-{i}"
+        proxima.run_mutation(proxima.commit_delta, "counter_changed", counter_id=counter_id,
+                             counter={"name": f"Counter {i}", "categories": CATEGORIES, "current_ticket": None})
+        counter_ids.append(counter_id)
+
+    if backend == "sqlite":
+        ok = run_round(proxima, args, counter_ids, data_dir, "sqlite backend")
+    else:
+        journal = proxima.state_backend
+        ok = run_round(proxima, args, counter_ids, data_dir,
+                       f"memory backend, fsync every {journal.sync_interval * 1000:g} ms")
+        # JOURNAL_SYNC_MS=0: every commit waits for its fsync, so claims interleave mid-mutation
+        journal.sync_interval = 0
+        journal.snapshot_every = args.snapshot_every
+        ok = run_round(proxima, args, counter_ids, data_dir,
+                       f"memory backend, JOURNAL_SYNC_MS=0, snapshot every {args.snapshot_every}") and ok
+        # phones: let removals from several counters land in one flush
+        proxima.broadcasts.window = 0.005
+        for shift_min in (0, proxima.QUEUE_SHIFT_MIN):
+            ok = phone_round(proxima, args, counter_ids, shift_min) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--greenlets", type=int, default=25)
+    parser.add_argument("--snapshot-every", type=int, default=100,
+                        help="journal records between snapshots in the JOURNAL_SYNC_MS=0 round")
+    parser.add_argument("--phones", type=int, default=400,
+                        help="waiting tickets with a phone in the in-memory phone rounds")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--counters", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+    else:
+        main(args)